@@ -1,12 +1,29 @@
 from __future__ import annotations
 import string
-from time import sleep
-from typing import Optional
+from time import sleep, perf_counter
+from typing import Callable, Optional
 from enum import Enum
-from random import randint
+from random import Random, randint
+from math import exp
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
 
 from designer import play_music
-from graph import GraphNode, GraphNodeType
+from graph import GRAPH_NODE_CODES, GraphArena, GraphNode, GraphNodeType
+from transposition import PieceKind, TranspositionBound, TranspositionTable, ZobristKeys, zobrist_keys
+from tablebase import EndgameTablebase, TablebaseResult
+from opening_book import OpeningBook
+from mcts import MonteCarloTreeSearch
+from search_trace import NO_SQUARE, TRACE_CUTOFF, SearchTraceWriter
+
+try:
+    import numpy as np
+    from batch_eval import evaluate_batch, masks_to_planes
+except ImportError:
+    # numpy is optional, without it states are always scored one at a time
+    np = None
 
 
 # [X] - Make sure the board is generating properly
@@ -70,158 +87,212 @@ def init_board(state: CheckersState) -> CheckersState:
 
     for i in range(0, both_side_size):
         for j in range(0 if odds else 1, state.cols, 2):
-            state.board[i][j].place_piece(CheckersPiece(
-                players[player], state.board[i][j].x, state.board[i][j].y, state.rows, state.cols))
+            state.place_piece(players[player], j, i)
         odds = not odds
 
     player += 1
     odds = True
     for i in range(0, both_side_size):
         for j in range(0 if odds else 1, state.cols, 2):
-            state.board[-1 * (i + 1)
-                        ][j].place_piece(CheckersPiece(players[player], state.board[-1 * (i + 1)][j].x, state.board[-1 * (i + 1)][j].y, state.rows, state.cols))
+            state.place_piece(players[player], j, state.rows - (i + 1))
         odds = not odds
 
     return state
 
 
+def iterate_bits(mask: int):
+    """
+    Yields the index of every set bit in the mask, lowest first
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def shift_mask(mask: int, amount: int) -> int:
+    return mask << amount if amount >= 0 else mask >> -amount
+
+
+def piece_heuristic_value(owner: CheckersPlayer, is_king: bool, x: int, y: int, geometry: BoardGeometry) -> int:
+    """
+    Computes the positional heuristic of a single piece (see CheckersPiece.compute_heuristic_value)
+    """
+    # Material count
+    value = 2 if is_king else 1
+
+    # King's position
+    opponents_kings_row_start, opponents_kings_row_end = geometry.kings_rows[owner]
+    # Is in opponents territory
+    if is_king and y <= opponents_kings_row_end and y >= opponents_kings_row_start:
+        # add - 10 to make sure the distance is +10 when it is right on the center
+        value += abs(geometry.centre_distance[geometry.square(x, y)] - 10)
+
+    # Control of the center
+    value += geometry.centre_distance[geometry.square(x, y)]
+
+    # King's Row
+    if not is_king and not (y <= opponents_kings_row_end and y >= opponents_kings_row_start):
+        # compute distance to kings row
+        value += abs(y - opponents_kings_row_start)
+
+    # Piece Advancement
+    if y <= (opponents_kings_row_start + 1):
+        value += abs(y - (opponents_kings_row_end + 1))
+
+    return value
+
+
+class BoardGeometry:
+    """
+    Everything about a rows x cols board that does not depend on the position, computed once per board size: bit masks
+    (square (x, y) is bit y * cols + x), playable squares, promotion rows, centre distances, step and jump tables and
+    the positional value of every piece on every square
+
+    Arguments:
+        self (BoardGeometry): The internal state
+        rows (int): The # of rows in the board
+        cols (int): The # of columns in the board
+    """
+
+    def __init__(self: BoardGeometry, rows: int, cols: int) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.squares = rows * cols
+        self.full = (1 << self.squares) - 1
+        self.top_row = (1 << cols) - 1
+        self.bottom_row = self.top_row << ((rows - 1) * cols)
+        # the row a side's men are crowned on
+        self.promotion_rows: dict[CheckersPlayer, int] = {
+            CheckersPlayer.BOTTOM: self.top_row,
+            CheckersPlayer.TOP: self.bottom_row,
+        }
+
+        self.coords: list[tuple[int, int]] = [
+            (square % cols, square // cols) for square in range(self.squares)]
+        # the squares init_board fills, pieces never leave them
+        self.playable_squares: tuple[int, ...] = tuple(
+            square for square, (x, y) in enumerate(self.coords) if (x + y) % 2 == 1)
+        self.playable = sum(1 << x for x in self.playable_squares)
+        # square -> its index among the playable squares, the tablebase ranks positions over these
+        self.playable_index: dict[int, int] = {
+            x: ind for ind, x in enumerate(self.playable_squares)}
+
+        # first and last row of each side's starting rows, where the other side's men are crowned
+        home_rows = (rows - 2) // 2
+        self.kings_rows: dict[CheckersPlayer, tuple[int, int]] = {
+            CheckersPlayer.TOP: (0, home_rows - 1),
+            CheckersPlayer.BOTTOM: (rows - home_rows, rows - 1),
+        }
+        self.centre_distance: list[int] = [
+            abs(y - rows // 2) + abs(x - cols // 2) for (x, y) in self.coords]
+
+        def columns_from(first_col: int, last_col: int) -> int:
+            mask = 0
+            for y in range(rows):
+                for x in range(max(first_col, 0), min(last_col, cols - 1) + 1):
+                    mask |= 1 << (y * cols + x)
+            return mask
+
+        # squares that can still step one column right (1) or left (-1) without leaving the board
+        self.col_guard: dict[int, int] = {
+            1: columns_from(0, cols - 2),
+            -1: columns_from(1, cols - 1),
+        }
+
+        # indexed [PieceKind.value][square], every target is already on the board
+        self.steps: list[list[tuple[int, ...]]] = []
+        self.jumps: list[list[tuple[tuple[int, int], ...]]] = []
+        for each_directions in (BOTTOM_DIRECTIONS, ALL_DIRECTIONS, TOP_DIRECTIONS, ALL_DIRECTIONS):
+            kind_steps: list[tuple[int, ...]] = []
+            kind_jumps: list[tuple[tuple[int, int], ...]] = []
+            for (x, y) in self.coords:
+                square_steps: list[int] = []
+                square_jumps: list[tuple[int, int]] = []
+                for (dx, dy) in each_directions:
+                    if 0 <= x + dx < cols and 0 <= y + dy < rows:
+                        square_steps.append((y + dy) * cols + x + dx)
+                    if 0 <= x + 2 * dx < cols and 0 <= y + 2 * dy < rows:
+                        square_jumps.append(
+                            ((y + dy) * cols + x + dx, (y + 2 * dy) * cols + x + 2 * dx))
+                kind_steps.append(tuple(square_steps))
+                kind_jumps.append(tuple(square_jumps))
+            self.steps.append(kind_steps)
+            self.jumps.append(kind_jumps)
+
+        # piece_heuristic_value for every (PieceKind, square) pair, used to keep the positional terms up to date incrementally
+        kinds = [(CheckersPlayer.BOTTOM, False), (CheckersPlayer.BOTTOM, True),
+                 (CheckersPlayer.TOP, False), (CheckersPlayer.TOP, True)]
+        self.square_values: list[list[int]] = [[piece_heuristic_value(
+            owner, is_king, x, y, self) for (x, y) in self.coords] for (owner, is_king) in kinds]
+
+    def square(self: BoardGeometry, x: int, y: int) -> int:
+        return y * self.cols + x
+
+    def step(self: BoardGeometry, mask: int, dx: int, dy: int) -> int:
+        """
+        Moves every bit of the mask one square along the (dx, dy) diagonal, dropping bits that fall off the board
+        """
+        return shift_mask(mask & self.col_guard[dx], dy * self.cols + dx) & self.full
+
+
+@lru_cache(maxsize=None)
+def board_geometry(rows: int, cols: int) -> BoardGeometry:
+    return BoardGeometry(rows, cols)
+
+
+# (dx, dy) diagonals each side's men travel along, kings use both
+BOTTOM_DIRECTIONS: list[tuple[int, int]] = [(1, -1), (-1, -1)]
+TOP_DIRECTIONS: list[tuple[int, int]] = [(1, 1), (-1, 1)]
+ALL_DIRECTIONS: list[tuple[int, int]] = BOTTOM_DIRECTIONS + TOP_DIRECTIONS
+
+
 def calculate_vulnerable_points(piece: CheckersPiece, board: CheckersState) -> int:
-    coord_x = piece.x
-    coord_y = piece.y
-
-    coord_x_lower_left, coord_y_lower_left, coord_y_upper_left, coord_x_upper_left, coord_x_upper_right, coord_y_upper_right, coord_y_lower_right, coord_x_lower_right = 0, 0, 0, 0, 0, 0, 0, 0
-
-    threats = 0
-
-    # upper left --> lower right
-    try:
-        coord_x_upper_left = coord_x - 1
-        coord_y_upper_left = coord_y + 1
-        coord_x_lower_right = coord_x + 1
-        coord_y_lower_right = coord_y - 1
-        is_threat = board.board[coord_y_upper_left][coord_x_upper_left].piece.owner != piece.owner and board.board[coord_y_lower_right][coord_x_lower_right].piece is None
-        threats += 1 if is_threat else 0
-    except:
-        pass
-
-    # upper right --> lower left
-    try:
-        coord_x_upper_right = coord_x + 1
-        coord_y_upper_right = coord_y + 1
-        coord_x_lower_left = coord_x - 1
-        coord_y_lower_left = coord_y - 1
-        is_threat = board.board[coord_y_upper_right][coord_x_upper_right].piece.owner != piece.owner and board.board[coord_y_lower_left][coord_x_lower_left] is None
-        threats += 1 if is_threat else 0
-    except:
-        pass
-
-    # IF KING lower left --> upper right
-    try:
-        is_threat = board.board[coord_y_lower_left][coord_x_lower_left].piece.owner != piece.owner and board.board[
-            coord_y_lower_left][coord_x_lower_left].piece.is_king and board.board[coord_y_upper_right][coord_x_upper_right] is None
-        threats += 1 if is_threat else 0
-    except:
-        pass
-
-    # IF KING lower right --> upper left
-    try:
-        is_threat = board.board[coord_y_lower_right][coord_x_lower_right].piece.owner != piece.owner and board.board[
-            coord_y_lower_right][coord_x_lower_right].piece.is_king and board.board[coord_y_upper_left][coord_x_upper_left] is None
-        threats += 1 if is_threat else 0
-    except:
-        pass
-
-    return threats
+    piece_bit = 1 << board.square(piece.x, piece.y)
+    return sum(1 for each_mask in board.threatened_masks(piece.owner) if each_mask & piece_bit)
 
 
 def calculate_safe_positions(piece: CheckersPiece, board: CheckersState) -> int:
     # safe being not in the diagonal path, or having a piece in the diagonal where it would land if it jumps
-
-    safe_points = 0
-    coord_x = piece.x
-    coord_y = piece.y
-
-    coord_x_upper_left = coord_x - 1
-    coord_y_upper_left = coord_y + 1
-    coord_x_lower_right = coord_x + 1
-    coord_y_lower_right = coord_y - 1
-    coord_x_upper_right = coord_x + 1
-    coord_y_upper_right = coord_y + 1
-    coord_x_lower_left = coord_x - 1
-    coord_y_lower_left = coord_y - 1
-    coord_x_left = coord_x - 1
-    coord_x_right = coord_x + 1
-    coord_y_above = coord_y - 1
-    coord_y_below = coord_y + 1
-
-    # upper left --> lower right
-    try:
-        is_safe = board.board[coord_y_upper_left][coord_x_upper_left].piece.owner != piece.owner and board.board[
-            coord_y_lower_right][coord_x_lower_right].piece is not None
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # upper right --> lower left
-    try:
-        is_safe = board.board[coord_y_upper_right][coord_x_upper_right].piece.owner != piece.owner and board.board[coord_y_lower_left][coord_x_lower_left] is not None
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # IF KING lower left --> upper right
-    try:
-        is_safe = board.board[coord_y_lower_left][coord_x_lower_left].piece.owner != piece.owner and board.board[
-            coord_y_lower_left][coord_x_lower_left].piece.is_king and board.board[coord_y_upper_right][coord_x_upper_right] is not None
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # IF KING lower right --> upper left
-    try:
-        is_safe = board.board[coord_y_lower_right][coord_x_lower_right].piece.owner != piece.owner and board.board[
-            coord_y_lower_right][coord_x_lower_right].piece.is_king and board.board[coord_y_upper_left][coord_x_upper_left] is not None
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # above
-    try:
-        is_safe = board.board[coord_y_above][coord_x].piece.owner != piece.owner
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # below
-    try:
-        is_safe = board.board[coord_y_below][coord_x].piece.owner != piece.owner
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # right
-    try:
-        is_safe = board.board[coord_y][coord_x_right].piece.owner != piece.owner
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    # left
-    try:
-        is_safe = board.board[coord_y][coord_x_left].piece.owner != piece.owner
-        safe_points += 1 if is_safe else 0
-    except:
-        pass
-
-    return safe_points
+    piece_bit = 1 << board.square(piece.x, piece.y)
+    return sum(1 for each_mask in board.guarded_masks(piece.owner) if each_mask & piece_bit)
 
 
 def is_forced_jump(piece: CheckersPiece, board: CheckersState) -> bool:
     return calculate_vulnerable_points(piece, board) > 0
 
 
-def sort_states_by_heuristic(states: list[CheckersState]) -> list[CheckersState]:
-    return sorted(states, key=lambda x: x.generate_heuristic())
+# below this many states the numpy setup costs more than scoring the states one by one
+BATCH_EVALUATION_THRESHOLD = 64
+
+
+def generate_heuristics(states: list[CheckersState], player: Optional[CheckersPlayer] = None) -> list[int]:
+    """
+    CheckersState.generate_heuristic for many states of the same board size, scored in one numpy pass when available
+    """
+    if np is None or len(states) < BATCH_EVALUATION_THRESHOLD:
+        return [x.generate_heuristic(player) for x in states]
+
+    rows, cols = states[0].rows, states[0].cols
+    scores = evaluate_batch(
+        masks_to_planes([x.bottom for x in states], rows, cols),
+        masks_to_planes([x.top for x in states], rows, cols),
+        masks_to_planes([x.kings for x in states], rows, cols),
+        np.array([(x.turn if player is None else player) ==
+                 CheckersPlayer.BOTTOM for x in states]),
+        np.array(board_geometry(rows, cols).square_values),
+        np.array([len(x.moves) for x in states]))
+
+    values: list[int] = []
+    for each_state, each_score in zip(states, scores):
+        each_state.value = int(each_score)
+        values.append(each_state.value)
+    return values
+
+
+def sort_states_by_heuristic(states: list[CheckersState], player: Optional[CheckersPlayer] = None, descending: bool = False) -> list[CheckersState]:
+    values = generate_heuristics(states, player)
+    return [x for _, x in sorted(zip(values, states), key=lambda x: x[0], reverse=descending)]
 
 
 """
@@ -262,6 +333,14 @@ class CheckersMoves(Enum):
     CAPTURE_BOTTOM_RIGHT = 7
 
 
+class SearchAlgorithm(Enum):
+    """
+    The recursion CheckersSearch uses, plain min/max alpha-beta or negamax principal variation search
+    """
+    ALPHABETA = 0
+    PVS = 1
+
+
 class CheckersTurn(Enum):
     """
     Represents who's turn it is
@@ -325,16 +404,20 @@ class CheckersMove:
 
     Arguments:
         self (CheckersMove): The internal state
-        board (list[list[BoardPiece]]): Represents a 2D array of board pieces
         from_x (int): The x coordinate where the piece is originating from
         from_y (int): The y coordinate where the piece is originating from
         to_x (int): The x coordinate where the piece is traveling to
         to_y (int): The y coordinate where the piece is traveling to
         capture (bool): Whether the piece is captured (field will be removed in future versions)
+        capture_x (int): The x coordinate of the first captured piece
+        capture_y (int): The y coordinate of the first captured piece
+        captured (tuple[tuple[int, int], ...]): Every captured piece of a multi-jump, in order (defaults to the first one)
+        path (tuple[tuple[int, int], ...]): The squares a multi-jump lands on before (to_x, to_y)
     """
+    __slots__ = ('from_x', 'from_y', 'to_x', 'to_y', 'capture',
+                 'capture_x', 'capture_y', 'captured', 'path')
 
-    def __init__(self: CheckersMove, board: list[list[BoardPiece]], from_x: int, from_y: int, to_x: int, to_y: int, capture: bool = False, capture_x=0, capture_y=0):
-        self.board = board
+    def __init__(self: CheckersMove, from_x: int, from_y: int, to_x: int, to_y: int, capture: bool = False, capture_x=0, capture_y=0, captured: tuple[tuple[int, int], ...] = (), path: tuple[tuple[int, int], ...] = ()):
         self.from_x = from_x
         self.from_y = from_y
         self.to_x = to_x
@@ -342,12 +425,25 @@ class CheckersMove:
         self.capture = capture
         self.capture_x = capture_x
         self.capture_y = capture_y
+        self.captured: tuple[tuple[int, int], ...] = captured if captured or not capture else (
+            (capture_x, capture_y),)
+        self.path: tuple[tuple[int, int], ...] = path
+
+    def key(self: CheckersMove) -> tuple:
+        return (self.from_x, self.from_y, self.to_x, self.to_y, self.captured)
+
+    def __eq__(self: CheckersMove, other: object) -> bool:
+        return isinstance(other, CheckersMove) and self.key() == other.key()
+
+    def __hash__(self: CheckersMove) -> int:
+        return hash(self.key())
 
     def __repr__(self: CheckersMove) -> str:
-        return f'From ({self.from_x}, {self.from_y}) TO ({self.to_x}, {self.to_y})'
+        return str(self)
 
     def __str__(self: CheckersMove) -> str:
-        return f'From ({self.from_x}, {self.from_y}) TO ({self.to_x}, {self.to_y})'
+        hops = ''.join(f' TO ({x}, {y})' for (x, y) in self.path)
+        return f'From ({self.from_x}, {self.from_y}){hops} TO ({self.to_x}, {self.to_y})'
 
 
 class CheckersPiece:
@@ -378,40 +474,9 @@ class CheckersPiece:
         self.cols = cols
 
     def compute_heuristic_value(self: CheckersPiece) -> int:
-        # Material count
-        self.value += 2 if self.is_king else 1
-
-        # King's position
-        opponents_kings_row_start = 0 if self.owner == CheckersPlayer.TOP else 5
-        opponents_kings_row_end = 2 if self.owner == CheckersPlayer.TOP else self.rows - 1
-        # Is in opponents territory
-        if self.is_king and self.y <= opponents_kings_row_end and self.y >= opponents_kings_row_start:
-            # Configure for any row size
-            col_bound_left = 0
-            col_bound_right = self.cols - 1
-            center_opponent_x = (opponents_kings_row_end +
-                                 opponents_kings_row_start) // 2
-            center_opponent_y = (col_bound_left + col_bound_right) // 2
-            # add - 10 to make sure the distance is +10 when it is right on the center
-            self.value += abs(abs(self.x - center_opponent_x) +
-                              abs(self.y - center_opponent_y) - 10)
-
-        # Control of the center
-        center_board_row = self.rows // 2
-        center_board_col = self.cols // 2
-        distance_center = abs(self.y - center_board_col) + \
-            abs(self.x - center_board_row)
-        self.value += distance_center
-
-        # King's Row
-        if not self.is_king and not (self.y <= opponents_kings_row_end and self.y >= opponents_kings_row_start):
-            # compute distance to kings row
-            dist_to_kings_row = abs(self.y - opponents_kings_row_start)
-            self.value += dist_to_kings_row
-
-        # Piece Advancement
-        if self.y <= (opponents_kings_row_start + 1):
-            self.value += abs(self.y - (opponents_kings_row_end + 1))
+        # Material count, King's position, Control of the center, King's Row, Piece Advancement
+        self.value = piece_heuristic_value(self.owner, self.is_king, self.x, self.y,
+                                           board_geometry(self.rows, self.cols))
 
         # Mobility (used in the board instance)
         # Threat Assessment (used in board instance)
@@ -422,7 +487,8 @@ class CheckersPiece:
         return self.value
 
     def clone(self: CheckersPiece) -> CheckersPiece:
-        cloned = CheckersPiece(self.owner, self.x, self.y)
+        cloned = CheckersPiece(self.owner, self.x, self.y, self.rows, self.cols)
+        cloned.is_king = self.is_king
         return cloned
 
     def __str__(self: CheckersPiece) -> str:
@@ -449,12 +515,14 @@ class CheckersState:
     """
     Represents a node in the state tree, a snapshot of the state of the game
 
+    The board is stored as three bitboards (bottom men/kings, top men/kings, kings), where square (x, y) is bit y * cols + x
+
     Arguments:
         self (CheckersState): The internal state
         rows (int): The # of rows in the board
         cols (int): The # of columns in the board
         curr_turn (Optional[CheckersPlayer]): The player who controls the current turn in the game
-        curr_board (Optional[list[BoardPiece]]): The current board in play
+        curr_board (Optional[list[BoardPiece]]): A board to load the pieces from
 
     Returns:
         The checkers state instance
@@ -463,10 +531,18 @@ class CheckersState:
     def __init__(self: CheckersState, rows: int, cols: int, curr_turn: Optional[CheckersPlayer] = None, curr_board: Optional[list[list[BoardPiece]]] = None) -> None:
         self.turn: CheckersPlayer = [CheckersPlayer.BOTTOM, CheckersPlayer.TOP][randint(
             0, 1)] if not curr_turn else curr_turn
-        self.board: list[list[BoardPiece]] = [[x.clone() for x in curr_board[y]] for y in range(rows)] if curr_board else generate_checkers_board(
-            rows, cols)
         self.rows = rows
         self.cols = cols
+        self.geometry: BoardGeometry = board_geometry(rows, cols)
+        self.zobrist: ZobristKeys = zobrist_keys(rows * cols)
+        self.square_values: list[list[int]] = self.geometry.square_values
+        self.bottom = 0
+        self.top = 0
+        self.kings = 0
+        # sum of piece_heuristic_value over each side's pieces, kept up to date by place_piece and make_move
+        self.bottom_value = 0
+        self.top_value = 0
+        self.hash = self.zobrist.side if self.turn == CheckersPlayer.TOP else 0
         self.value = 0
         self.moves: list[CheckersMove] = []
         self.explored: bool = False
@@ -475,50 +551,182 @@ class CheckersState:
         self.applied_move_str: str = ''
         self.applied_move: Optional[CheckersMove] = None
 
+        if curr_board:
+            for each_row in curr_board:
+                for each_tile in each_row:
+                    if each_tile.piece is not None:
+                        self.place_piece(each_tile.piece.owner, each_tile.x,
+                                         each_tile.y, each_tile.piece.is_king)
+
+    def __getstate__(self: CheckersState) -> dict:
+        # the per-board-size tables are shared caches, they are looked up again when unpickled instead of being copied
+        pickled = self.__dict__.copy()
+        del pickled['geometry'], pickled['zobrist'], pickled['square_values']
+        return pickled
+
+    def __setstate__(self: CheckersState, pickled: dict) -> None:
+        self.__dict__.update(pickled)
+        self.geometry = board_geometry(self.rows, self.cols)
+        self.zobrist = zobrist_keys(self.rows * self.cols)
+        self.square_values = self.geometry.square_values
+
+    def square(self: CheckersState, x: int, y: int) -> int:
+        return y * self.cols + x
+
+    def coords(self: CheckersState, square: int) -> tuple[int, int]:
+        return (square % self.cols, square // self.cols)
+
+    def place_piece(self: CheckersState, owner: CheckersPlayer, x: int, y: int, is_king: bool = False) -> None:
+        square = self.square(x, y)
+        bit = 1 << square
+        if owner == CheckersPlayer.BOTTOM:
+            self.bottom |= bit
+        else:
+            self.top |= bit
+        if is_king:
+            self.kings |= bit
+        kind = self.piece_kind(square).value
+        self.hash ^= self.zobrist.pieces[kind][square]
+        if owner == CheckersPlayer.BOTTOM:
+            self.bottom_value += self.square_values[kind][square]
+        else:
+            self.top_value += self.square_values[kind][square]
+
+    def piece_kind(self: CheckersState, square: int) -> PieceKind:
+        bit = 1 << square
+        if self.bottom & bit:
+            return PieceKind.BOTTOM_KING if self.kings & bit else PieceKind.BOTTOM_MAN
+        return PieceKind.TOP_KING if self.kings & bit else PieceKind.TOP_MAN
+
+    def compute_hash(self: CheckersState) -> int:
+        """
+        Computes the zobrist hash from scratch, make_move keeps self.hash up to date incrementally
+        """
+        computed = self.zobrist.side if self.turn == CheckersPlayer.TOP else 0
+        for each_square in iterate_bits(self.bottom | self.top):
+            computed ^= self.zobrist.pieces[self.piece_kind(
+                each_square).value][each_square]
+        return computed
+
+    def pieces_of(self: CheckersState, player: CheckersPlayer) -> int:
+        return self.bottom if player == CheckersPlayer.BOTTOM else self.top
+
+    def opponent_of(self: CheckersState, player: CheckersPlayer) -> CheckersPlayer:
+        return CheckersPlayer.BOTTOM if player == CheckersPlayer.TOP else CheckersPlayer.TOP
+
+    @property
+    def board(self: CheckersState) -> list[list[BoardPiece]]:
+        """
+        Materializes the bitboards as a grid of BoardPiece, used for display only
+        """
+        board = generate_checkers_board(self.rows, self.cols)
+        for owner, owner_mask in ((CheckersPlayer.BOTTOM, self.bottom), (CheckersPlayer.TOP, self.top)):
+            for each_square in iterate_bits(owner_mask):
+                x, y = self.coords(each_square)
+                piece = CheckersPiece(owner, x, y, self.rows, self.cols)
+                piece.is_king = bool(self.kings >> each_square & 1)
+                board[y][x].place_piece(piece)
+        return board
+
     def next_turn(self: CheckersState) -> None:
         self.turn = CheckersPlayer.BOTTOM if self.turn == CheckersPlayer.TOP else CheckersPlayer.TOP
+        self.hash ^= self.zobrist.side
 
     def clone(self: CheckersState) -> CheckersState:
-        turn = self.turn
-        cloned_state = CheckersState(
-            self.rows, self.cols, self.turn, self.board)
+        cloned_state = CheckersState(self.rows, self.cols, self.turn)
+        cloned_state.bottom = self.bottom
+        cloned_state.top = self.top
+        cloned_state.kings = self.kings
+        cloned_state.hash = self.hash
+        cloned_state.bottom_value = self.bottom_value
+        cloned_state.top_value = self.top_value
         cloned_state.value = self.value
         cloned_state.explored = self.explored
         cloned_state.depth = self.depth
-        cloned_state.turn = turn
 
         return cloned_state
 
     def clone_board(self: CheckersState) -> list[list[BoardPiece]]:
-        cloned_board: list[list[BoardPiece]] = []
-        for each_row in self.board:
-            sub_row = []
-            for each_board_tile in each_row:
-                sub_row.append(each_board_tile.clone())
-            cloned_board.append(sub_row)
-            sub_row = []
-        return cloned_board
-
-    def process_move(self: CheckersState, move: Optional[CheckersMove]) -> CheckersState:
-        cloned_state = self.clone()
-        cloned_state.explored = False
-
-        if move.capture:
+        return self.board
+
+    def make_move(self: CheckersState, move: CheckersMove) -> tuple:
+        """
+        Applies the move to this state in place
+
+        Arguments:
+            self (CheckersState): The internal state
+            move (CheckersMove): The move to apply, must be legal in this state
+
+        Returns:
+            An undo token, pass it to unmake_move to restore the state
+        """
+        undo_token = (self.bottom, self.top, self.kings, self.turn, self.depth, self.hash, self.bottom_value, self.top_value,
+                      self.moves, self.applied_move, self.applied_move_str, self.explored)
+        piece_keys = self.zobrist.pieces
+        square_values = self.square_values
+
+        from_square = self.square(move.from_x, move.from_y)
+        to_square = self.square(move.to_x, move.to_y)
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+        moving_kind = self.piece_kind(from_square)
+
+        for (capture_x, capture_y) in move.captured:
             # erase piece
-            cloned_state.board[move.capture_y][move.capture_x].piece = None
+            capture_square = self.square(capture_x, capture_y)
+            captured_kind = self.piece_kind(capture_square).value
+            self.hash ^= piece_keys[captured_kind][capture_square]
+            if self.bottom & (1 << capture_square):
+                self.bottom_value -= square_values[captured_kind][capture_square]
+            else:
+                self.top_value -= square_values[captured_kind][capture_square]
+            capture_clear = ~(1 << capture_square)
+            self.bottom &= capture_clear
+            self.top &= capture_clear
+            self.kings &= capture_clear
+
+        # a king's multi-jump can end on the square it started from, the xors then cancel out
+        if self.bottom & from_bit:
+            self.bottom ^= from_bit ^ to_bit
+            promotion_row = self.geometry.promotion_rows[CheckersPlayer.BOTTOM]
+        else:
+            self.top ^= from_bit ^ to_bit
+            promotion_row = self.geometry.promotion_rows[CheckersPlayer.TOP]
+
+        if self.kings & from_bit:
+            self.kings ^= from_bit ^ to_bit
+        elif to_bit & promotion_row:
+            self.kings |= to_bit
+
+        landed_kind = self.piece_kind(to_square).value
+        self.hash ^= piece_keys[moving_kind.value][from_square] ^ piece_keys[landed_kind][to_square]
+        value_delta = square_values[landed_kind][to_square] - \
+            square_values[moving_kind.value][from_square]
+        if self.bottom & to_bit:
+            self.bottom_value += value_delta
+        else:
+            self.top_value += value_delta
+
+        self.applied_move_str = str(move)
+        self.applied_move = move
+        self.explored = False
+        self.moves = []
 
-        moving_piece = cloned_state.board[move.from_y][move.from_x].clone()
-        moving_piece.piece.x = move.to_x
-        moving_piece.piece.y = move.to_y
+        self.next_turn()
+        self.depth += 1
 
-        cloned_state.board[move.from_y][move.from_x].piece = None
-        cloned_state.board[move.to_y][move.to_x] = moving_piece
-        cloned_state.applied_move_str = str(move)
-        cloned_state.applied_move = move
+        return undo_token
 
-        cloned_state.next_turn()
-        cloned_state.depth += 1
+    def unmake_move(self: CheckersState, undo_token: tuple) -> None:
+        """
+        Restores the state to how it was before the make_move call that produced the undo token
+        """
+        (self.bottom, self.top, self.kings, self.turn, self.depth, self.hash, self.bottom_value, self.top_value,
+         self.moves, self.applied_move, self.applied_move_str, self.explored) = undo_token
 
+    def process_move(self: CheckersState, move: Optional[CheckersMove]) -> CheckersState:
+        cloned_state = self.clone()
+        cloned_state.make_move(move)
         return cloned_state
 
     def process_moves(self: CheckersState) -> list[CheckersState]:
@@ -527,191 +735,185 @@ class CheckersState:
             processed_moves.append(self.process_move(each_move))
         return processed_moves
 
+    def movers(self: CheckersState, player: CheckersPlayer, direction: tuple[int, int]) -> int:
+        """
+        The player's pieces that are allowed to travel along the direction (men only move forward, kings move both ways)
+        """
+        pieces = self.pieces_of(player)
+        forward = BOTTOM_DIRECTIONS if player == CheckersPlayer.BOTTOM else TOP_DIRECTIONS
+        return pieces if direction in forward else pieces & self.kings
+
     def generate_potential_moves(self: CheckersState) -> list[CheckersMove]:
+        """
+        Generates the legal moves of the player to move, captures are mandatory: when any capture exists only the
+        capture sequences (including every multi-jump continuation) are returned
+        """
         # if is king, then can make all 4 jumps, if is not,
         # check if top then only down left down right, if bottom then only up left up right
-        bottom_team_moves = [CheckersMoves.DIAG_TOP_RIGHT, CheckersMoves.DIAG_TOP_LEFT,
-                             CheckersMoves.CAPTURE_TOP_RIGHT, CheckersMoves.CAPTURE_TOP_LEFT]
-        top_team_moves = [CheckersMoves.DIAG_BOTTOM_RIGHT, CheckersMoves.DIAG_BOTTOM_LEFT,
-                          CheckersMoves.CAPTURE_BOTTOM_RIGHT, CheckersMoves.CAPTURE_BOTTOM_LEFT]
-
-        curr_turn_pieces: list[CheckersPiece] = []
-        cloned_board = self.clone_board()
-        for each_board_row in cloned_board:
-            for each_board_tile in each_board_row:
-
-                # current piece owner is the current turn's player
-                if each_board_tile.piece is not None and each_board_tile.piece.owner == self.turn:
-                    curr_turn_pieces.append(each_board_tile.piece)
+        occupied = self.bottom | self.top
+        own = self.pieces_of(self.turn)
+        enemy = occupied & ~own
+        man_kind = PieceKind.BOTTOM_MAN.value if self.turn == CheckersPlayer.BOTTOM else PieceKind.TOP_MAN.value
+        promotion_row = self.geometry.promotion_rows[self.turn]
+        coords = self.geometry.coords
+
+        capture_moves: list[CheckersMove] = []
+        for each_square in iterate_bits(own):
+            # the king kind always follows the man kind of the same side
+            is_king = self.kings >> each_square & 1
+            self.generate_capture_sequences(each_square, each_square, man_kind + is_king, 0 if is_king else promotion_row,
+                                            occupied & ~(1 << each_square), enemy, (), capture_moves)
+        if capture_moves:
+            self.moves = capture_moves
+            return capture_moves
 
         potential_moves: list[CheckersMove] = []
-        for each_owner_piece in curr_turn_pieces:
-            x = each_owner_piece.x
-            y = each_owner_piece.y
-            rightx_ind, leftx_ind, upy_ind, downy_ind, capture_rightx_ind, capture_leftx_ind, capture_upy_ind, capture_downy_ind = x + \
-                1, x - 1, y - 1, y + 1, x + 2, x - 2, y - 2, y + 2
-            diag_ur_ind, diag_ul_ind, diag_dr_ind, diag_dl_ind, capture_ur_ind, capture_ul_ind, capture_dr_ind, capture_dl_ind = (rightx_ind, upy_ind), (leftx_ind, upy_ind), (rightx_ind, downy_ind), (
-                leftx_ind, downy_ind), (capture_rightx_ind, capture_upy_ind), (capture_leftx_ind, capture_upy_ind), (capture_rightx_ind, capture_downy_ind), (capture_leftx_ind, capture_downy_ind)
-
-            top_team_coords = [diag_dr_ind, diag_dl_ind,
-                               capture_dr_ind, capture_dl_ind]
-            bottom_team_coords = [diag_ur_ind,
-                                  diag_ul_ind, capture_ur_ind, capture_ul_ind]
-
-            is_bottom_team = each_owner_piece.owner == CheckersPlayer.BOTTOM
-            move_types = bottom_team_moves if is_bottom_team else top_team_moves
-
-            if each_owner_piece.is_king:
-                # can move both directions
-                move_types.extend(
-                    top_team_moves if is_bottom_team else bottom_team_moves)
-                if is_bottom_team:
-                    bottom_team_coords.extend(top_team_coords)
-                else:
-                    top_team_coords.extend(bottom_team_coords)
-
-            coords = bottom_team_coords if is_bottom_team else top_team_coords
-            for ind, each_move in enumerate(move_types):
-                [calc_x, calc_y] = coords[ind]
-                match each_move:
-                    case CheckersMoves.DIAG_TOP_RIGHT | CheckersMoves.DIAG_TOP_LEFT | CheckersMoves.DIAG_BOTTOM_RIGHT | CheckersMoves.DIAG_BOTTOM_LEFT:
-                        if calc_y < len(cloned_board) and calc_x < len(cloned_board[1]) and cloned_board[calc_y][calc_x].piece is None:
-                            potential_moves.append(CheckersMove(
-                                cloned_board, x, y, calc_x, calc_y))
-                    case CheckersMoves.CAPTURE_TOP_RIGHT | CheckersMoves.CAPTURE_TOP_LEFT | CheckersMoves.CAPTURE_BOTTOM_RIGHT | CheckersMoves.CAPTURE_BOTTOM_LEFT:
-                        [diag_x, diag_y] = coords[ind % 2]
-                        if calc_y < len(cloned_board) and calc_x < len(cloned_board[1]):
-                            jump_piece = cloned_board[calc_y][calc_x].piece
-                            middle_piece = cloned_board[diag_y][diag_x].piece
-                            if jump_piece is None and middle_piece is not None and middle_piece.owner is not each_owner_piece.owner:
-                                potential_moves.append(CheckersMove(
-                                    cloned_board, x, y, calc_x, calc_y, True, diag_x, diag_y))
+        for each_square in iterate_bits(own):
+            kind = man_kind + (self.kings >> each_square & 1)
+            from_x, from_y = coords[each_square]
+
+            for each_to in self.geometry.steps[kind][each_square]:
+                if not occupied >> each_to & 1:
+                    to_x, to_y = coords[each_to]
+                    potential_moves.append(
+                        CheckersMove(from_x, from_y, to_x, to_y))
 
         self.moves = potential_moves
         return potential_moves
 
-    def total_vulnerable_positions(self: CheckersState) -> int:
-        your_pieces = []
-        for each_board_row in self.board:
-            for each_cell in each_board_row:
-                if each_cell.piece is not None and each_cell.piece.owner == self.turn:
-                    # found your piece
-                    your_pieces.append(each_cell.piece)
-
-        # compiled a list of your pieces, now check the diagonals
-        total_vulnerable_positions = 0
-
-        for each_piece in your_pieces:
-            total_vulnerable_positions += calculate_vulnerable_points(
-                each_piece, self)
-        return total_vulnerable_positions
-
-    def total_safe_positions(self: CheckersState) -> int:
-        your_pieces = []
-        for each_board_row in self.board:
-            for each_cell in each_board_row:
-                if each_cell.piece is not None and each_cell.piece.owner == self.turn:
-                    # found your piece
-                    your_pieces.append(each_cell.piece)
-
-        total_safe_positions = 0
-
-        for each_piece in your_pieces:
-            total_safe_positions += calculate_safe_positions(each_piece, self)
-
-        return total_safe_positions
-
-    def total_forced_jumps(self: CheckersState) -> int:
-        your_pieces = []
-        for each_board_row in self.board:
-            for each_cell in each_board_row:
-                if each_cell.piece is not None and each_cell.piece.owner == self.turn:
-                    # found your piece
-                    your_pieces.append(each_cell.piece)
-
-        total_jumps = 0
-
-        for each_piece in your_pieces:
-            total_jumps += is_forced_jump(each_piece, self)
-
-        return total_jumps
-
-    def calculate_board_control(self: CheckersState) -> int:
-        your_pieces = []
-        enemy_pieces = []
-        for each_board_row in self.board:
-            for each_cell in each_board_row:
-                if each_cell.piece is not None and each_cell.piece.owner == self.turn:
-                    # found your piece
-                    your_pieces.append(each_cell.piece)
-                elif each_cell.piece is not None:
-                    enemy_pieces.append(each_cell.piece)
-        return len(your_pieces) - len(enemy_pieces)
-
-    def calculate_total_pieces_heuristic(self: CheckersState) -> int:
-        your_pieces: list[CheckersPiece] = []
-        for each_board_row in self.board:
-            for each_cell in each_board_row:
-                if each_cell.piece is not None and each_cell.piece.owner == self.turn:
-                    # found your piece
-                    your_pieces.append(each_cell.piece)
-
-        total_heuristic = 0
-
-        for each_piece in your_pieces:
-            total_heuristic += each_piece.compute_heuristic_value()
-
-        return total_heuristic
-
-    def generate_heuristic(self: CheckersState) -> int:
-        # Mobility (used in the board instance) DONE
-        # Threat Assessment (used in board instance)
-        # Safety (used in board instance)
-        # Forced Jumps (used in board instance)
-        # Board control (used in board instance)
-
+    def generate_capture_sequences(self: CheckersState, origin: int, at: int, kind: int, promotion_row: int, occupied: int, capturable: int, jumps: tuple[tuple[int, int], ...], capture_moves: list[CheckersMove]) -> None:
+        """
+        Depth first search over the jump chains of the piece that started on `origin` and currently stands on `at`
+
+        Jumped pieces stay on the board until the move is over (they block landings and cannot be jumped twice), and a man
+        that reaches the promotion row ends its move there
+        """
+        extended = False
+        for (each_jumped, each_to) in self.geometry.jumps[kind][at]:
+            if capturable >> each_jumped & 1 and not occupied >> each_to & 1:
+                extended = True
+                chain = jumps + ((each_jumped, each_to),)
+                if promotion_row >> each_to & 1:
+                    self.record_capture_sequence(origin, chain, capture_moves)
+                else:
+                    self.generate_capture_sequences(origin, each_to, kind, promotion_row, occupied,
+                                                    capturable & ~(1 << each_jumped), chain, capture_moves)
+
+        if not extended and jumps:
+            self.record_capture_sequence(origin, jumps, capture_moves)
+
+    def record_capture_sequence(self: CheckersState, origin: int, jumps: tuple[tuple[int, int], ...], capture_moves: list[CheckersMove]) -> None:
+        coords = self.geometry.coords
+        from_x, from_y = coords[origin]
+        to_x, to_y = coords[jumps[-1][1]]
+        captured = tuple(coords[x] for (x, _) in jumps)
+        path = tuple(coords[x] for (_, x) in jumps[:-1])
+        capture_moves.append(CheckersMove(
+            from_x, from_y, to_x, to_y, True, captured[0][0], captured[0][1], captured, path))
+
+    def threatened_masks(self: CheckersState, player: CheckersPlayer) -> list[int]:
+        """
+        For each diagonal, the player's pieces that an adjacent enemy can jump because the landing square is empty
+        """
+        pieces = self.pieces_of(player)
+        opponent = self.opponent_of(player)
+        empty = self.geometry.full & ~(self.bottom | self.top)
+
+        threatened: list[int] = []
+        for (dx, dy) in ALL_DIRECTIONS:
+            # attacker sits on (x + dx, y + dy) and jumps towards (x - dx, y - dy)
+            attackers = self.geometry.step(
+                self.movers(opponent, (-dx, -dy)), -dx, -dy)
+            landings = self.geometry.step(empty, dx, dy)
+            threatened.append(pieces & attackers & landings)
+        return threatened
+
+    def guarded_masks(self: CheckersState, player: CheckersPlayer) -> list[int]:
+        """
+        For each diagonal, the player's pieces next to an enemy that cannot jump them because the landing square is taken
+        """
+        pieces = self.pieces_of(player)
+        opponent = self.opponent_of(player)
+        occupied = self.bottom | self.top
+
+        guarded: list[int] = []
+        for (dx, dy) in ALL_DIRECTIONS:
+            attackers = self.geometry.step(
+                self.movers(opponent, (-dx, -dy)), -dx, -dy)
+            blockers = self.geometry.step(occupied, dx, dy)
+            guarded.append(pieces & attackers & blockers)
+        return guarded
+
+    def total_vulnerable_positions(self: CheckersState, player: Optional[CheckersPlayer] = None) -> int:
+        player = self.turn if player is None else player
+        return sum(x.bit_count() for x in self.threatened_masks(player))
+
+    def total_safe_positions(self: CheckersState, player: Optional[CheckersPlayer] = None) -> int:
+        player = self.turn if player is None else player
+        return sum(x.bit_count() for x in self.guarded_masks(player))
+
+    def total_forced_jumps(self: CheckersState, player: Optional[CheckersPlayer] = None) -> int:
+        player = self.turn if player is None else player
+        forced = 0
+        for each_mask in self.threatened_masks(player):
+            forced |= each_mask
+        return forced.bit_count()
+
+    def calculate_board_control(self: CheckersState, player: Optional[CheckersPlayer] = None) -> int:
+        player = self.turn if player is None else player
+        your_pieces = self.pieces_of(player)
+        enemy_pieces = self.pieces_of(self.opponent_of(player))
+        return your_pieces.bit_count() - enemy_pieces.bit_count()
+
+    def calculate_total_pieces_heuristic(self: CheckersState, player: Optional[CheckersPlayer] = None) -> int:
+        # maintained as deltas by place_piece and make_move
+        player = self.turn if player is None else player
+        return self.bottom_value if player == CheckersPlayer.BOTTOM else self.top_value
+
+    def generate_heuristic(self: CheckersState, player: Optional[CheckersPlayer] = None) -> int:
+        """
+        Scores the state for the player (the player to move if not given), calling it again gives the same value
+        """
         # Mobility
-        self.value += len(self.moves)
+        value = len(self.moves)
 
         # Threat Assessment
-        self.value -= self.total_vulnerable_positions()
+        value -= self.total_vulnerable_positions(player)
 
         # Safety
-        self.value += self.total_safe_positions()
+        value += self.total_safe_positions(player)
 
         # Forced jumps
-        self.value += self.total_forced_jumps()
+        value += self.total_forced_jumps(player)
 
         # Board Control
-        self.value += self.calculate_board_control()
+        value += self.calculate_board_control(player)
 
         # Material Count
         # King's Position
         # Control of the Center
-        self.value += self.calculate_total_pieces_heuristic()
+        # Piece Advancement
+        value += self.calculate_total_pieces_heuristic(player)
 
-        return self.value
+        self.value = value
+        return value
+
+    def square_str(self: CheckersState, square: int) -> str:
+        bit = 1 << square
+        return 'B' if self.bottom & bit else 'T' if self.top & bit else 'E'
 
     def __str__(self: CheckersState) -> str:
         stringified_rows = []
-        for each_row in self.board:
-            stringified_rows.append('\t'.join([str(y) for y in each_row]))
+        for y in range(self.rows):
+            stringified_rows.append('\t'.join([self.square_str(
+                self.square(x, y)) for x in range(self.cols)]))
         return '\n'.join(stringified_rows)
 
     def print_board(self: CheckersState) -> None:
-        stringified_rows = []
-        for each_row in self.board:
-            stringified_rows.append('\t'.join([str(y) for y in each_row]))
-        for each_row in stringified_rows:
-            print(each_row)
+        print(str(self))
 
     def is_winner(self: CheckersState) -> bool:
-        pieces_owners = []
-        for each_row in self.board:
-            for each_tile in each_row:
-                if each_tile.piece is not None and not each_tile.piece.owner in pieces_owners:
-                    pieces_owners.append(each_tile.piece.owner)
-        return len(pieces_owners) == 1
+        return (self.bottom == 0) != (self.top == 0)
 
 
 class CheckersGraphNode(GraphNode):
@@ -740,59 +942,183 @@ class CheckersGraphNode(GraphNode):
         if self.state is None:
             return False
 
-        board_pieces = self.state.board
-        player_count = {}
-        for each_board_row in board_pieces:
-            for each_tile in each_board_row:
-                if each_tile.piece != None:
-                    if each_tile.piece.owner in player_count:
-                        player_count[each_tile.piece.owner] += 1
-                    else:
-                        player_count[each_tile.piece.owner] = 1
         # only 1 player left on board
-        return len(player_count.keys()) == 1
+        return self.state.is_winner()
 
     def __str__(self: CheckersGraphNode):
-        str_board = []
-        for each_row in self.state.board:
-            sub_board = []
-            for each_piece in each_row:
-                sub_board.append(str(each_piece))
-            str_board.append(''.join(sub_board))
-        return ''.join(str_board)
+        return ''.join(self.state.square_str(x) for x in range(self.state.rows * self.state.cols))
 
 
-def recursive_deepening_dfs(curr_node: CheckersGraphNode, visited_states: Optional[dict[str, int]] = None, depth_limit=5):
+def recursive_deepening_dfs(curr_node: CheckersGraphNode, visited_states: Optional[TranspositionTable] = None, depth_limit=5, pending_leaves: Optional[dict[int, list[CheckersGraphNode]]] = None, quiescence: bool = True, root_depth: Optional[int] = None):
     if visited_states is None:
-        visited_states = {}
+        visited_states = TranspositionTable()
+
+    # leaves are collected by hash and scored together once the outermost call has built the tree
+    is_outermost = pending_leaves is None
+    if pending_leaves is None:
+        pending_leaves = {}
+    # the depth limit counts plies from the node the build started at
+    if root_depth is None:
+        root_depth = curr_node.state.depth
+    remaining_depth = depth_limit - (curr_node.state.depth - root_depth)
+
+    if curr_node.children:
+        # expanded by the build of an earlier turn (see reroot_tree), only its frontier is extended
+        for each_recur_child in curr_node.children:
+            recursive_deepening_dfs(each_recur_child, visited_states,
+                                    depth_limit, pending_leaves, quiescence, root_depth)
+        if is_outermost:
+            score_pending_leaves(pending_leaves, visited_states)
+        return curr_node
 
-    if str(curr_node) in visited_states or curr_node.state.depth == depth_limit or curr_node.is_goal_state():
+    if curr_node.spec == GraphNodeType.TERMINAL:
+        # a leaf of an earlier build, takes its min/max turn back in case it is expanded now
+        curr_node.spec = GraphNodeType.MIN if curr_node.parent is not None and curr_node.parent.spec == GraphNodeType.MAX else GraphNodeType.MAX
+
+    moves = peek_moves(curr_node.state)
+    if not moves:
+        # the player to move is out of pieces or blocked and has lost, whatever the depth
+        curr_node.value = lost_value(curr_node.spec)
+        curr_node.spec = GraphNodeType.TERMINAL
+        curr_node.is_winning_move = True
+        if is_outermost:
+            score_pending_leaves(pending_leaves, visited_states)
+        return curr_node
+
+    key = curr_node.state.hash
+    visited = visited_states.probe(key)
+    if visited is not None and visited.generation != visited_states.generation and visited.depth < remaining_depth:
+        # scored by an earlier build closer to its frontier than this node is now
+        visited = None
+    # past the depth limit only pending captures are expanded, so leaves are scored once the position is quiet
+    past_limit = remaining_depth <= 0 and not (quiescence and moves[0].capture)
+    if visited is not None or key in pending_leaves or past_limit or curr_node.is_goal_state():
         is_goal = curr_node.is_goal_state()
         curr_node.spec = GraphNodeType.TERMINAL
         curr_node.is_winning_move = is_goal
-        curr_node.value = curr_node.state.generate_heuristic() if str(
-            curr_node) not in visited_states else visited_states[str(curr_node)]
-        visited_states[str(curr_node)] = curr_node.value
+        if visited is not None:
+            curr_node.value = visited.score
+        else:
+            pending_leaves.setdefault(key, []).append(curr_node)
+        if is_outermost:
+            score_pending_leaves(pending_leaves, visited_states)
         return curr_node
 
-    curr_node.state.generate_potential_moves()
-    children_states = sort_states_by_heuristic(curr_node.state.process_moves())
+    # ordered without evaluating the children, longest captures first: the tree is scored by get_value, which visits
+    # every child whatever the order
+    curr_node.state.moves = moves
+    moves = sorted(moves, key=lambda x: len(x.captured), reverse=True)
     children = []
 
-    for each_child_state in children_states:
-        child_node = CheckersGraphNode(
-            curr_node.spec, True, each_child_state)
-        child_node.parent = curr_node
-        children.append(child_node)
+    for each_move in moves:
+        children.append(CheckersGraphNode(
+            curr_node.spec, True, curr_node.state.process_move(each_move)))
 
     curr_node.add_children(children)
 
     for each_recur_child in children:
-        recursive_deepening_dfs(each_recur_child, visited_states)
+        recursive_deepening_dfs(each_recur_child, visited_states,
+                                depth_limit, pending_leaves, quiescence, root_depth)
 
+    if is_outermost:
+        score_pending_leaves(pending_leaves, visited_states)
     return curr_node
 
 
+def reroot_tree(curr_node: CheckersGraphNode, move: CheckersMove) -> CheckersGraphNode:
+    """
+    The node reached by playing the move, detached from the rest of the tree so its searched subtree is kept for the
+    next recursive_deepening_dfs, which then only extends the frontier. A fresh node is made when the move was never
+    expanded
+    """
+    for each_child in curr_node.children:
+        if each_child.state.applied_move == move:
+            each_child.parent = None
+            return each_child
+    return CheckersGraphNode(curr_node.spec, True, curr_node.state.process_move(move))
+
+
+def build_arena_tree(state: CheckersState, depth_limit: int = 5, quiescence: bool = True, spec: GraphNodeType = GraphNodeType.MAX) -> GraphArena:
+    """
+    Builds a min/max tree of the state into a GraphArena, one state is walked with make_move/unmake_move and only the
+    move and value of every node are kept (node 0 is the root, arena.node(0) can be passed to alphabeta_pruning)
+
+    Leaves are made like recursive_deepening_dfs does (positions without moves are lost, past the depth limit only
+    pending captures are expanded), but there is no transposition table: a position reached again is expanded again
+    instead of becoming a leaf with its stored score, so the tree can be larger and its values differ
+
+    The move of a node is its index in its parent's generate_potential_moves, see arena_move
+    """
+    arena = GraphArena()
+    arena.add_root(spec)
+    working_state = state.clone()
+    # leaves are scored for their player to move, like score_pending_leaves
+    leaf_values: dict[int, int] = {}
+
+    def expand(index: int, remaining_depth: int) -> None:
+        moves = working_state.generate_potential_moves()
+        if not moves:
+            # the player to move has lost, whatever the depth
+            arena.specs[index] = GRAPH_NODE_CODES[GraphNodeType.TERMINAL]
+            arena.values[index] = lost_value(arena.spec(index))
+            return
+        past_limit = remaining_depth <= 0 and not (
+            quiescence and moves[0].capture)
+        if past_limit or working_state.is_winner():
+            working_state.moves = []
+            if working_state.hash not in leaf_values:
+                leaf_values[working_state.hash] = working_state.generate_heuristic()
+            arena.specs[index] = GRAPH_NODE_CODES[GraphNodeType.TERMINAL]
+            arena.values[index] = leaf_values[working_state.hash]
+            return
+
+        child_spec = GraphNodeType.MIN if arena.spec(
+            index) == GraphNodeType.MAX else GraphNodeType.MAX
+        children = arena.add_children(
+            index, [child_spec] * len(moves), [-1] * len(moves), list(range(len(moves))))
+        for each_child, each_move in zip(children, moves):
+            undo_token = working_state.make_move(each_move)
+            expand(each_child, remaining_depth - 1)
+            working_state.unmake_move(undo_token)
+
+    expand(0, depth_limit)
+    return arena
+
+
+def arena_move(arena: GraphArena, index: int, parent_state: CheckersState) -> CheckersMove:
+    """
+    The move that reached the node of a build_arena_tree arena, given the state of its parent node
+    """
+    return parent_state.clone().generate_potential_moves()[arena.moves[index]]
+
+
+def peek_moves(state: CheckersState) -> list[CheckersMove]:
+    """
+    The legal moves of the state, which keeps the moves it had (a leaf's heuristic counts them for mobility). Captures
+    are mandatory, so the first move is a capture exactly when one is pending
+    """
+    generated_moves = state.moves
+    moves = state.generate_potential_moves()
+    state.moves = generated_moves
+    return moves
+
+
+def lost_value(spec: GraphNodeType) -> float:
+    # the value of a min/max node whose player to move has lost, the max player loses at its own nodes
+    return float('-inf') if spec == GraphNodeType.MAX else float('inf')
+
+
+def score_pending_leaves(pending_leaves: dict[int, list[CheckersGraphNode]], visited_states: TranspositionTable) -> None:
+    keys = list(pending_leaves.keys())
+    values = generate_heuristics(
+        [pending_leaves[x][0].state for x in keys])
+    for each_key, each_value in zip(keys, values):
+        for each_leaf in pending_leaves[each_key]:
+            each_leaf.value = each_value
+        visited_states.store(each_key, 0, TranspositionBound.EXACT, each_value)
+    pending_leaves.clear()
+
+
 def alphabeta_pruning(curr_node: CheckersGraphNode, alpha=float('-inf'), beta=float('inf')) -> float:
     if curr_node.spec == GraphNodeType.TERMINAL:
         return curr_node.value
@@ -817,6 +1143,825 @@ def alphabeta_pruning(curr_node: CheckersGraphNode, alpha=float('-inf'), beta=fl
     return curr_value
 
 
+# score of a won position, larger than any heuristic value
+WIN_SCORE = 10_000
+
+# mixed into the transposition key of searches run for the top player, heuristic scores are not symmetric between players
+TOP_PERSPECTIVE_KEY = 0x9E3779B97F4A7C15
+
+# how many nodes are searched between two checks of the clock
+TIME_CHECK_INTERVAL = 256
+
+# half width of the aspiration window around the previous iteration's score
+ASPIRATION_WINDOW = 8
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search once the time or node budget is spent, unwinds to the iterative deepening driver
+    """
+
+
+class CheckersSearch:
+    """
+    Alpha-beta search that generates moves on demand inside the recursion, walking a single state with make_move/unmake_move
+    instead of materializing the tree with recursive_deepening_dfs first
+
+    Arguments:
+        self (CheckersSearch): The internal state
+        table (Optional[TranspositionTable]): The transposition table to use, a fresh one is created if not given
+        algorithm (SearchAlgorithm): The recursion to search with
+        aspiration_window (int): Half width of the window iterative deepening opens around the previous score, 0 searches every iteration with a full window
+        quiescence (bool): Whether positions with a pending capture are searched further (captures only) instead of scored at the depth limit
+        tablebase (Optional[EndgameTablebase]): Endgame results looked up below the root instead of searching, anything with the same probe method works
+        book (Optional[OpeningBook]): Opening moves iterative deepening plays without searching, anything with the same lookup method works
+        trace (Optional[SearchTraceWriter]): Every searched node (including quiescence) is streamed to it, scores and bounds from the root player's perspective
+
+    Returns:
+        The search instance
+    """
+
+    def __init__(self: CheckersSearch, table: Optional[TranspositionTable] = None, algorithm: SearchAlgorithm = SearchAlgorithm.ALPHABETA, aspiration_window: int = 0, quiescence: bool = True, tablebase: Optional[EndgameTablebase] = None, book: Optional[OpeningBook] = None, trace: Optional[SearchTraceWriter] = None) -> None:
+        self.table: TranspositionTable = table if table is not None else TranspositionTable()
+        self.algorithm = algorithm
+        self.aspiration_window = aspiration_window
+        self.use_quiescence = quiescence
+        self.tablebase = tablebase
+        self.book = book
+        self.player: CheckersPlayer = CheckersPlayer.BOTTOM
+        self.perspective_key = 0
+        self.nodes = 0
+        # per search statistics: nodes whose moves were generated, how many moves they had and how many of them were cut
+        # off (and cut off by their first move)
+        self.expanded = 0
+        self.generated_moves = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.deadline: Optional[float] = None
+        self.node_budget: Optional[int] = None
+        self.pv: list[CheckersMove] = []
+        self.follow_pv = False
+        self.completed_depth = 0
+        # two quiet moves per ply that caused a beta cutoff
+        self.killers: list[list[Optional[CheckersMove]]] = []
+        # (player, from, to) -> accumulated depth * depth of the cutoffs the quiet move caused
+        self.history: dict[tuple[CheckersPlayer, int, int, int, int], int] = {}
+        self.trace = trace
+        # the trace records of the nodes being searched, the last one is the parent of the next node
+        self.trace_parents: list[int] = []
+        if trace is not None:
+            # only a traced search pays for the bookkeeping, the recursion is wrapped on the instance
+            self.alphabeta = self.traced(self.alphabeta, False)
+            self.pvs = self.traced(self.pvs, True)
+            self.quiescence = self.traced(self.quiescence, False)
+
+    def traced(self: CheckersSearch, search_node: Callable, negamax: bool) -> Callable:
+        """
+        Wraps alphabeta, pvs or quiescence so every node it enters is written to the trace, a node the search is stopped
+        in (SearchTimeout) is left marked incomplete
+
+        Arguments:
+            self (CheckersSearch): The internal state
+            search_node (Callable): The recursion method
+            negamax (bool): Whether it scores for the player to move (pvs) instead of the root player
+
+        Returns:
+            The traced recursion method
+        """
+        def traced_node(state: CheckersState, *arguments):
+            # alphabeta and pvs take (depth, alpha, beta, ply), quiescence (alpha, beta, ply)
+            depth = arguments[0] if len(arguments) == 4 else 0
+            alpha, beta, ply = arguments[-3:]
+            move = state.applied_move if ply > 0 else None
+            index = self.trace.begin(state.hash, self.trace_parents[-1] if self.trace_parents else -1,
+                                     state.square(move.from_x, move.from_y) if move is not None else NO_SQUARE,
+                                     state.square(move.to_x, move.to_y) if move is not None else NO_SQUARE, ply, depth)
+            self.trace_parents.append(index)
+            try:
+                result = search_node(state, *arguments)
+            finally:
+                self.trace_parents.pop()
+
+            score = result[0] if isinstance(result, tuple) else result
+            bound = TranspositionBound.UPPER if score <= alpha else TranspositionBound.LOWER if score >= beta else TranspositionBound.EXACT
+            # a cutoff is a fail high for the player to move, the window is in the same perspective as the score
+            if negamax or state.turn == self.player:
+                cutoff = bound == TranspositionBound.LOWER
+            else:
+                cutoff = bound == TranspositionBound.UPPER
+            if negamax and state.turn != self.player:
+                score, bound = -score, flip_bound(bound)
+            self.trace.end(index, score, bound, TRACE_CUTOFF if cutoff else 0)
+            return result
+
+        return traced_node
+
+    def prepare(self: CheckersSearch, state: CheckersState) -> None:
+        self.player = state.turn
+        self.perspective_key = TOP_PERSPECTIVE_KEY if self.player == CheckersPlayer.TOP else 0
+        self.nodes = 0
+        self.expanded = 0
+        self.generated_moves = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.deadline = None
+        self.node_budget = None
+        self.pv = []
+        self.follow_pv = False
+        self.killers = []
+        # older history counts out, the position has moved on
+        self.history = {x: y // 2 for x, y in self.history.items() if y > 1}
+        self.table.new_search()
+
+    def search(self: CheckersSearch, state: CheckersState, depth: int) -> tuple[float, Optional[CheckersMove]]:
+        """
+        Searches the state `depth` plies deep, scores are from the perspective of the player to move in `state`
+
+        Returns:
+            The score of the state and the best move found (None if the game is over)
+        """
+        self.prepare(state)
+        return self.root_search(state.clone(), depth, float('-inf'), float('inf'))
+
+    def root_search(self: CheckersSearch, state: CheckersState, depth: int, alpha: float, beta: float) -> tuple[float, Optional[CheckersMove]]:
+        # the root player is to move, so negamax scores are already from its perspective
+        if self.algorithm == SearchAlgorithm.PVS:
+            return self.pvs(state, depth, alpha, beta, 0)
+        return self.alphabeta(state, depth, alpha, beta, 0)
+
+    def aspiration_search(self: CheckersSearch, state: CheckersState, depth: int, previous_score: float) -> tuple[float, Optional[CheckersMove]]:
+        """
+        Searches with a narrow window around the previous iteration's score, re-searching with the failing side opened
+        up when the score falls outside of it
+        """
+        if self.aspiration_window <= 0 or abs(previous_score) == float('inf'):
+            return self.root_search(state, depth, float('-inf'), float('inf'))
+
+        alpha = previous_score - self.aspiration_window
+        beta = previous_score + self.aspiration_window
+        while True:
+            follow_pv = self.follow_pv
+            score, move = self.root_search(state, depth, alpha, beta)
+            if score <= alpha:
+                alpha = float('-inf')
+            elif score >= beta:
+                beta = float('inf')
+            else:
+                return score, move
+            self.follow_pv = follow_pv
+
+    def iterative_deepening(self: CheckersSearch, state: CheckersState, time_budget: Optional[float] = 1.0, node_budget: Optional[int] = None, max_depth: int = 64) -> tuple[float, Optional[CheckersMove]]:
+        """
+        Searches depth 1, 2, 3... until the time (seconds) or node budget runs out, each iteration tries the previous
+        iteration's principal variation first
+
+        Returns:
+            The score and best move of the deepest completed iteration (depth 1 always completes), or the book move
+        """
+        self.prepare(state)
+        self.completed_depth = 0
+        booked = self.book_move(state)
+        if booked is not None:
+            return booked
+
+        started = perf_counter()
+        working_state = state.clone()
+        best_score, best_move = float('-inf'), None
+
+        for depth in range(1, max_depth + 1):
+            if depth > 1:
+                # the first iteration always completes so there is a move to fall back on
+                self.deadline = started + time_budget if time_budget is not None else None
+                self.node_budget = node_budget
+                if self.deadline is not None and perf_counter() >= self.deadline:
+                    break
+            self.follow_pv = len(self.pv) > 0
+            try:
+                score, move = self.aspiration_search(
+                    working_state, depth, best_score)
+            except SearchTimeout:
+                # the aborted iteration left moves applied on working_state, it is not reused
+                break
+
+            best_score, best_move = score, move
+            self.completed_depth = depth
+            self.pv = self.principal_variation(state, depth)
+            if move is None or abs(score) >= WIN_SCORE - max_depth:
+                # game over, or a forced win / loss was found
+                break
+
+        return best_score, best_move
+
+    def book_move(self: CheckersSearch, state: CheckersState) -> Optional[tuple[float, CheckersMove]]:
+        """
+        The opening book's move for the state, None when out of book (or the book move is not legal here)
+        """
+        if self.book is None:
+            return None
+        booked = self.book.lookup(state.rows, state.cols, state.hash)
+        if booked is None:
+            return None
+        move_index, score = booked
+        moves = state.clone().generate_potential_moves()
+        # a hash collision can point past the moves of this position
+        return (score, moves[move_index]) if move_index < len(moves) else None
+
+    def principal_variation(self: CheckersSearch, state: CheckersState, depth: int) -> list[CheckersMove]:
+        """
+        Follows the best moves stored in the transposition table from the state
+        """
+        pv: list[CheckersMove] = []
+        walked_state = state.clone()
+        seen: set[int] = set()
+        while len(pv) < depth and walked_state.hash not in seen:
+            seen.add(walked_state.hash)
+            entry = self.table.probe(
+                walked_state.hash ^ self.perspective_key)
+            if entry is None or entry.best_move is None or entry.best_move not in walked_state.generate_potential_moves():
+                break
+            pv.append(entry.best_move)
+            walked_state.make_move(entry.best_move)
+        return pv
+
+    def check_budget(self: CheckersSearch) -> None:
+        if self.node_budget is not None and self.nodes >= self.node_budget:
+            raise SearchTimeout()
+        if self.deadline is not None and self.nodes % TIME_CHECK_INTERVAL == 0 and perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+    def evaluate(self: CheckersSearch, state: CheckersState, ply: int) -> float:
+        if state.is_winner():
+            return self.terminal_score(state, ply)
+        return state.generate_heuristic(self.player)
+
+    def tablebase_score(self: CheckersSearch, state: CheckersState, ply: int) -> Optional[float]:
+        """
+        The score of a position the tablebase covers, None when it does not (or at the root, which needs a move)
+
+        Won and lost positions are scored like the end of the game the tablebase's distance away, so the quickest win
+        is preferred and the search makes progress towards it. The heuristic is not centred on 0, so a draw keeps the
+        static evaluation of the position
+        """
+        if self.tablebase is None or ply == 0:
+            return None
+        result = self.tablebase.probe(state.geometry, state.bottom,
+                                      state.top, state.kings, state.turn == CheckersPlayer.TOP)
+        if result is None:
+            return None
+        result, plies = result
+        if result == TablebaseResult.DRAW:
+            return self.evaluate(state, ply)
+        # the result is for the player to move
+        won = (result == TablebaseResult.WIN) == (state.turn == self.player)
+        return WIN_SCORE - (ply + plies) if won else -(WIN_SCORE - (ply + plies))
+
+    def terminal_score(self: CheckersSearch, state: CheckersState, ply: int) -> float:
+        # the side to move has lost (no pieces or no moves left), prefer the quickest win and the slowest loss
+        return -(WIN_SCORE - ply) if state.turn == self.player else WIN_SCORE - ply
+
+    def order_moves(self: CheckersSearch, state: CheckersState, moves: list[CheckersMove], ply: int, tt_move: Optional[CheckersMove]) -> list[CheckersMove]:
+        """
+        Orders moves without evaluating them: longest captures first, then the transposition table move, the killer moves
+        of the ply and finally by history score. On the previous iteration's principal variation its move goes first
+        """
+        killers = self.killers[ply] if ply < len(self.killers) else []
+
+        def move_priority(move: CheckersMove) -> tuple[int, bool, int, int]:
+            killer_rank = 2 if killers and move == killers[0] else 1 if len(
+                killers) > 1 and move == killers[1] else 0
+            return (len(move.captured), move == tt_move, killer_rank, self.history.get((state.turn, move.from_x, move.from_y, move.to_x, move.to_y), 0))
+
+        ordered = sorted(moves, key=move_priority, reverse=True)
+        if self.follow_pv:
+            # still on the previous iteration's principal variation, its move goes first
+            if ply < len(self.pv) and self.pv[ply] in ordered:
+                ordered.remove(self.pv[ply])
+                ordered.insert(0, self.pv[ply])
+            else:
+                self.follow_pv = False
+        return ordered
+
+    def record_cutoff(self: CheckersSearch, state: CheckersState, move: CheckersMove, depth: int, ply: int, move_index: int = 0) -> None:
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        if move.capture:
+            # captures are already ordered first
+            return
+        while len(self.killers) <= ply:
+            self.killers.append([None, None])
+        if self.killers[ply][0] != move:
+            self.killers[ply] = [move, self.killers[ply][0]]
+        history_key = (state.turn, move.from_x,
+                       move.from_y, move.to_x, move.to_y)
+        self.history[history_key] = self.history.get(
+            history_key, 0) + depth * depth
+
+    def alphabeta(self: CheckersSearch, state: CheckersState, depth: int, alpha: float, beta: float, ply: int) -> tuple[float, Optional[CheckersMove]]:
+        self.nodes += 1
+        self.check_budget()
+        key = state.hash ^ self.perspective_key
+        alpha_orig, beta_orig = alpha, beta
+
+        entry = self.table.probe(key)
+        tt_move: Optional[CheckersMove] = None
+        if entry is not None:
+            tt_move = entry.best_move
+            if ply > 0 and entry.depth >= depth:
+                if entry.bound == TranspositionBound.EXACT:
+                    return entry.score, entry.best_move
+                if entry.bound == TranspositionBound.LOWER:
+                    alpha = max(alpha, entry.score)
+                else:
+                    beta = min(beta, entry.score)
+                if alpha >= beta:
+                    return entry.score, entry.best_move
+
+        known_score = self.tablebase_score(state, ply)
+        if known_score is not None:
+            return known_score, None
+        if depth <= 0 and self.use_quiescence:
+            return self.quiescence(state, alpha, beta, ply), None
+        if depth <= 0 or state.is_winner():
+            return self.evaluate(state, ply), None
+
+        moves = state.generate_potential_moves()
+        if not moves:
+            return self.terminal_score(state, ply), None
+        moves = self.order_moves(state, moves, ply, tt_move)
+        self.expanded += 1
+        self.generated_moves += len(moves)
+
+        maximizing = state.turn == self.player
+        best_score = float('-inf') if maximizing else float('inf')
+        best_move: Optional[CheckersMove] = None
+        for ind, each_move in enumerate(moves):
+            undo_token = state.make_move(each_move)
+            score, _ = self.alphabeta(state, depth - 1, alpha, beta, ply + 1)
+            state.unmake_move(undo_token)
+
+            if maximizing:
+                if score > best_score:
+                    best_score, best_move = score, each_move
+                alpha = max(alpha, best_score)
+            else:
+                if score < best_score:
+                    best_score, best_move = score, each_move
+                beta = min(beta, best_score)
+            if alpha >= beta:
+                self.record_cutoff(state, each_move, depth, ply, ind)
+                break
+
+        bound = TranspositionBound.UPPER if best_score <= alpha_orig else TranspositionBound.LOWER if best_score >= beta_orig else TranspositionBound.EXACT
+        self.table.store(key, depth, bound, best_score, best_move)
+        return best_score, best_move
+
+    def quiescence(self: CheckersSearch, state: CheckersState, alpha: float, beta: float, ply: int) -> float:
+        """
+        Extends a leaf through its pending captures only, so the score is taken once the position is quiet
+
+        The side to move may stand pat on the static score: a side that is already at or past its bound is cut off
+        without searching its captures. Scores are from the root player's perspective like alphabeta
+        """
+        self.nodes += 1
+        self.check_budget()
+        if state.is_winner():
+            return self.terminal_score(state, ply)
+
+        # the mobility term counts state.moves, so it is scored before generating the captures and the moves are put back
+        # afterwards, a re-search of the same leaf (pvs) then scores it the same way
+        stand_pat = self.evaluate(state, ply)
+        generated_moves = state.moves
+        captures = state.generate_potential_moves()
+        state.moves = generated_moves
+        if not captures:
+            return self.terminal_score(state, ply)
+        if not captures[0].capture:
+            # captures are mandatory, so a quiet move means there are no captures
+            return stand_pat
+
+        maximizing = state.turn == self.player
+        best_score = stand_pat
+        if maximizing:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+
+        for each_capture in sorted(captures, key=lambda x: len(x.captured), reverse=True):
+            undo_token = state.make_move(each_capture)
+            score = self.quiescence(state, alpha, beta, ply + 1)
+            state.unmake_move(undo_token)
+
+            if maximizing:
+                best_score = max(best_score, score)
+                alpha = max(alpha, best_score)
+            else:
+                best_score = min(best_score, score)
+                beta = min(beta, best_score)
+            if alpha >= beta:
+                break
+        return best_score
+
+    def pvs(self: CheckersSearch, state: CheckersState, depth: int, alpha: float, beta: float, ply: int) -> tuple[float, Optional[CheckersMove]]:
+        """
+        Negamax principal variation search: the first move gets the full window, every later move is only proven worse
+        with a null window and re-searched when it turns out better. Scores are from the perspective of the player to move,
+        the transposition table keeps the root player's perspective so it is shared with alphabeta
+        """
+        self.nodes += 1
+        self.check_budget()
+        key = state.hash ^ self.perspective_key
+        sign = 1 if state.turn == self.player else -1
+        alpha_orig = alpha
+
+        entry = self.table.probe(key)
+        tt_move: Optional[CheckersMove] = None
+        if entry is not None:
+            tt_move = entry.best_move
+            if ply > 0 and entry.depth >= depth:
+                entry_score = sign * entry.score
+                entry_bound = entry.bound if sign == 1 else flip_bound(
+                    entry.bound)
+                if entry_bound == TranspositionBound.EXACT:
+                    return entry_score, entry.best_move
+                if entry_bound == TranspositionBound.LOWER:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score, entry.best_move
+
+        known_score = self.tablebase_score(state, ply)
+        if known_score is not None:
+            return sign * known_score, None
+        if depth <= 0 and self.use_quiescence:
+            window = (alpha, beta) if sign == 1 else (-beta, -alpha)
+            return sign * self.quiescence(state, window[0], window[1], ply), None
+        if depth <= 0 or state.is_winner():
+            return sign * self.evaluate(state, ply), None
+
+        moves = state.generate_potential_moves()
+        if not moves:
+            return sign * self.terminal_score(state, ply), None
+        moves = self.order_moves(state, moves, ply, tt_move)
+        self.expanded += 1
+        self.generated_moves += len(moves)
+
+        best_score = float('-inf')
+        best_move: Optional[CheckersMove] = None
+        for ind, each_move in enumerate(moves):
+            undo_token = state.make_move(each_move)
+            if ind == 0:
+                score = -self.pvs(state, depth - 1, -beta, -alpha, ply + 1)[0]
+            else:
+                # scores are integers, so a window of width one proves the move is no better than alpha
+                score = -self.pvs(state, depth - 1, -alpha - 1, -alpha, ply + 1)[0]
+                if alpha < score < beta:
+                    score = -self.pvs(state, depth - 1, -
+                                      beta, -alpha, ply + 1)[0]
+            state.unmake_move(undo_token)
+
+            if score > best_score:
+                best_score, best_move = score, each_move
+            alpha = max(alpha, best_score)
+            if alpha >= beta:
+                self.record_cutoff(state, each_move, depth, ply, ind)
+                break
+
+        bound = TranspositionBound.UPPER if best_score <= alpha_orig else TranspositionBound.LOWER if best_score >= beta else TranspositionBound.EXACT
+        self.table.store(key, depth, bound if sign == 1 else flip_bound(
+            bound), sign * best_score, best_move)
+        return best_score, best_move
+
+
+def flip_bound(bound: TranspositionBound) -> TranspositionBound:
+    """
+    The bound of the negated score
+    """
+    if bound == TranspositionBound.LOWER:
+        return TranspositionBound.UPPER
+    if bound == TranspositionBound.UPPER:
+        return TranspositionBound.LOWER
+    return bound
+
+
+# per process state of the root search workers, set by init_root_worker
+_worker_alpha = None
+_worker_search: Optional[CheckersSearch] = None
+
+
+def init_root_worker(shared_alpha, table_bits: int) -> None:
+    global _worker_alpha, _worker_search
+    _worker_alpha = shared_alpha
+    _worker_search = CheckersSearch(TranspositionTable(table_bits))
+
+
+def search_root_move(state: CheckersState, move_index: int, move: CheckersMove, depth: int) -> tuple[int, float, bool, int]:
+    """
+    Searches one root move inside a worker process, starting from the best root score any worker has proven so far
+
+    Returns:
+        The move index, its score, whether the score is exact (otherwise it is an upper bound) and the # of searched nodes
+    """
+    search = _worker_search
+    # which worker gets which move depends on timing, so nothing is carried over between tasks
+    search.table.clear()
+    search.history = {}
+    search.prepare(state)
+    # one below the shared bound so moves that tie the best score still come back exact, which keeps the result deterministic
+    alpha = _worker_alpha.value - 1
+    working_state = state.clone()
+    working_state.make_move(move)
+    score, _ = search.alphabeta(working_state, depth - 1, alpha, float('inf'), 1)
+
+    with _worker_alpha.get_lock():
+        if score > _worker_alpha.value:
+            _worker_alpha.value = score
+    return move_index, score, score > alpha, search.nodes
+
+
+class ParallelCheckersSearch:
+    """
+    Splits the root of the search over a process pool, Young Brothers Wait style: the first (eldest) root move is
+    searched in this process to establish a bound, then the remaining moves are farmed out to the workers, which share
+    the best root score found through shared memory
+
+    The chosen move does not depend on worker timing: the first root move (in move order) with the highest score wins,
+    the same move a serial search picks
+
+    Arguments:
+        self (ParallelCheckersSearch): The internal state
+        workers (Optional[int]): The # of worker processes, defaults to the # of cpus
+        table_bits (int): The size (2 ** table_bits entries) of the transposition table of every process
+
+    Returns:
+        The parallel search instance
+    """
+
+    def __init__(self: ParallelCheckersSearch, workers: Optional[int] = None, table_bits: int = 18) -> None:
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.table_bits = table_bits
+        self.search_instance = CheckersSearch(TranspositionTable(table_bits))
+        self.shared_alpha = multiprocessing.Value('d', float('-inf'))
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.nodes = 0
+
+    def search(self: ParallelCheckersSearch, state: CheckersState, depth: int) -> tuple[float, Optional[CheckersMove]]:
+        """
+        Searches the state `depth` plies deep, see CheckersSearch.search
+        """
+        local_search = self.search_instance
+        # nothing is carried over from earlier searches either, the result only depends on the state and depth
+        local_search.table.clear()
+        local_search.history = {}
+        local_search.prepare(state)
+        moves = state.clone().generate_potential_moves()
+        if depth <= 0 or not moves or len(moves) == 1 or self.workers <= 1:
+            score, move = local_search.search(state, depth)
+            self.nodes = local_search.nodes
+            return score, move
+
+        # the eldest brother is searched first with the full window
+        moves = local_search.order_moves(state, moves, 0, None)
+        working_state = state.clone()
+        working_state.make_move(moves[0])
+        best_score, _ = local_search.alphabeta(
+            working_state, depth - 1, float('-inf'), float('inf'), 1)
+        best_move = moves[0]
+        self.nodes = local_search.nodes
+        self.shared_alpha.value = best_score
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_root_worker,
+                                            initargs=(self.shared_alpha, self.table_bits))
+        futures = [self.pool.submit(search_root_move, state, ind, each_move, depth)
+                   for ind, each_move in enumerate(moves) if ind > 0]
+        results = sorted(x.result() for x in futures)
+
+        for (move_index, score, is_exact, nodes) in results:
+            self.nodes += nodes
+            if is_exact and score > best_score:
+                best_score, best_move = score, moves[move_index]
+
+        return best_score, best_move
+
+    def close(self: ParallelCheckersSearch) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self: ParallelCheckersSearch) -> ParallelCheckersSearch:
+        return self
+
+    def __exit__(self: ParallelCheckersSearch, *args) -> None:
+        self.close()
+
+
+class ExpectimaxSearch:
+    """
+    Expectimax over CheckersGraphNode trees: the player to move at the root maximizes and the opponent is modelled as
+    a chance node that picks its moves at random, uniformly or (given a temperature) by a softmax of its own heuristic.
+    Chance nodes are pruned with Star1 (and Star2 probing when their children are searched further), using the bounds
+    every score is clamped to, and can search a weighted sample of their moves instead of all of them
+
+    The searched tree is kept on the node passed to search: max nodes are MAX, chance nodes EXPECTIMAX with the
+    probability of every child set, and a node whose search was cut off is left as a TERMINAL leaf holding the bound
+    that cut it, so get_value of the root gives back the searched score
+
+    Arguments:
+        self (ExpectimaxSearch): The internal state
+        lower (float): The lowest score of any position (a loss), leaf scores are clamped to [lower, upper]
+        upper (float): The highest score of any position (a win)
+        temperature (Optional[float]): The softmax temperature of the opponent model, None for equally likely moves
+        sample_limit (Optional[int]): Chance nodes with more moves than this search a weighted sample of this many
+        probing (bool): Whether chance nodes probe their children first (Star2) for tighter lower bounds, the probes
+            are searched again afterwards so it only pays off when lower and upper are tight around the leaf scores
+        seed (Optional[int]): The seed of the sampling
+
+    Returns:
+        The search instance
+    """
+
+    def __init__(self: ExpectimaxSearch, lower: float = -WIN_SCORE, upper: float = WIN_SCORE, temperature: Optional[float] = None, sample_limit: Optional[int] = None, probing: bool = False, seed: Optional[int] = None) -> None:
+        self.lower = lower
+        self.upper = upper
+        self.temperature = temperature
+        self.sample_limit = sample_limit
+        self.probing = probing
+        self.generator = Random(seed)
+        self.player: CheckersPlayer = CheckersPlayer.BOTTOM
+        self.root: Optional[CheckersGraphNode] = None
+        self.best_child: Optional[CheckersGraphNode] = None
+        self.nodes = 0
+        self.cutoffs = 0
+
+    def search(self: ExpectimaxSearch, curr_node: CheckersGraphNode, depth: int) -> tuple[float, Optional[CheckersMove]]:
+        """
+        Searches the node's state `depth` plies deep, scores are from the perspective of the player to move in it
+
+        Returns:
+            The expected score and the best move, None if the game is over
+        """
+        self.player = curr_node.state.turn
+        self.root = curr_node
+        self.best_child = None
+        self.nodes = 0
+        self.cutoffs = 0
+        score = self.max_value(curr_node, depth, self.lower, self.upper)
+        return score, self.best_child.state.applied_move if self.best_child is not None else None
+
+    def evaluate(self: ExpectimaxSearch, state: CheckersState, has_moves: bool) -> float:
+        if not has_moves:
+            # the player to move has lost
+            return self.lower if state.turn == self.player else self.upper
+        return min(max(state.generate_heuristic(self.player), self.lower), self.upper)
+
+    def expand(self: ExpectimaxSearch, curr_node: CheckersGraphNode, spec: GraphNodeType) -> list[CheckersGraphNode]:
+        """
+        The children of the node (its moves must be generated), max nodes' children ordered best first for the max
+        player, chance nodes' children most likely first with their probabilities set (and sampled when there are more
+        than sample_limit)
+        """
+        children_states = curr_node.state.process_moves()
+        if spec == GraphNodeType.MAX:
+            children_states = sort_states_by_heuristic(
+                children_states, self.player, True)
+            probabilities = [1.0] * len(children_states)
+        else:
+            probabilities = self.move_probabilities(curr_node.state, children_states)
+            ranked = sorted(range(len(children_states)), key=lambda x: probabilities[x], reverse=True)
+            if self.sample_limit is not None and len(ranked) > self.sample_limit:
+                # weighted sampling without replacement, each move keyed by u ^ (1 / p)
+                ranked = sorted(ranked, key=lambda x: self.generator.random() ** (1 / probabilities[x]),
+                                reverse=True)[:self.sample_limit]
+                ranked.sort(key=lambda x: probabilities[x], reverse=True)
+            total = sum(probabilities[x] for x in ranked)
+            children_states = [children_states[x] for x in ranked]
+            probabilities = [probabilities[x] / total for x in ranked]
+
+        children_spec = GraphNodeType.EXPECTIMAX if spec == GraphNodeType.MAX else GraphNodeType.MAX
+        children: list[CheckersGraphNode] = []
+        for each_child_state, each_probability in zip(children_states, probabilities):
+            child_node = CheckersGraphNode(children_spec, state=each_child_state)
+            child_node.parent = curr_node
+            child_node.probability = each_probability
+            children.append(child_node)
+        return children
+
+    def move_probabilities(self: ExpectimaxSearch, state: CheckersState, children_states: list[CheckersState]) -> list[float]:
+        if self.temperature is None:
+            return [1 / len(children_states)] * len(children_states)
+        # the opponent prefers the moves its own heuristic scores higher
+        scores = generate_heuristics(children_states, state.turn)
+        best_score = max(scores)
+        weights = [exp((x - best_score) / self.temperature) for x in scores]
+        total = sum(weights)
+        return [x / total for x in weights]
+
+    def leaf(self: ExpectimaxSearch, curr_node: CheckersGraphNode, has_moves: bool) -> float:
+        curr_node.spec = GraphNodeType.TERMINAL
+        curr_node.is_winning_move = curr_node.is_goal_state()
+        curr_node.value = self.evaluate(curr_node.state, has_moves)
+        return curr_node.value
+
+    def cut(self: ExpectimaxSearch, curr_node: CheckersGraphNode, bound: float) -> float:
+        self.cutoffs += 1
+        curr_node.children = []
+        curr_node.spec = GraphNodeType.TERMINAL
+        curr_node.value = bound
+        return bound
+
+    def max_value(self: ExpectimaxSearch, curr_node: CheckersGraphNode, depth: int, alpha: float, beta: float) -> float:
+        """
+        Fail soft alpha-beta over the chance node children
+        """
+        self.nodes += 1
+        has_moves = bool(curr_node.state.generate_potential_moves())
+        if depth <= 0 or not has_moves:
+            return self.leaf(curr_node, has_moves)
+
+        children = self.expand(curr_node, GraphNodeType.MAX)
+        best_score = float('-inf')
+        searched: list[CheckersGraphNode] = []
+        for each_child in children:
+            score = self.chance_value(each_child, depth - 1, max(alpha, best_score), beta)
+            searched.append(each_child)
+            if score > best_score:
+                best_score = score
+                if curr_node is self.root:
+                    self.best_child = each_child
+            if best_score >= beta:
+                self.cutoffs += 1
+                break
+        # a cut off node keeps only the children it searched, their max is its (lower bound) score
+        curr_node.spec = GraphNodeType.MAX
+        curr_node.children = searched
+        return best_score
+
+    def probe_value(self: ExpectimaxSearch, curr_node: CheckersGraphNode, depth: int, alpha: float, beta: float) -> float:
+        """
+        Star2 probe of a max node, only its first (best ordered) child is searched, which bounds the node from below
+        """
+        self.nodes += 1
+        has_moves = bool(curr_node.state.generate_potential_moves())
+        if depth <= 0 or not has_moves:
+            return self.evaluate(curr_node.state, has_moves)
+        # the node is expanded again when it is searched, the probe's children are not kept
+        first_child = self.expand(curr_node, GraphNodeType.MAX)[0]
+        return self.chance_value(first_child, depth - 1, alpha, beta)
+
+    def chance_value(self: ExpectimaxSearch, curr_node: CheckersGraphNode, depth: int, alpha: float, beta: float) -> float:
+        """
+        Star1 / Star2 pruned expectation over the max node children, every child is searched with the window that
+        proves the whole node is outside (alpha, beta) as soon as it is: the children not searched yet are assumed to
+        be worth `upper` (or their probed value for the lower bound, `lower` without probing)
+        """
+        self.nodes += 1
+        has_moves = bool(curr_node.state.generate_potential_moves())
+        if depth <= 0 or not has_moves:
+            return self.leaf(curr_node, has_moves)
+
+        children = self.expand(curr_node, GraphNodeType.EXPECTIMAX)
+        probabilities = [x.probability for x in children]
+        lower_bounds = [self.lower] * len(children)
+
+        if self.probing and depth > 1:
+            # Star2, the probed lower bounds of every child can already prove a fail high
+            probed_score = self.lower
+            for index, each_child in enumerate(children):
+                others = probed_score - probabilities[index] * lower_bounds[index]
+                lower_bounds[index] = self.probe_value(each_child, depth - 1, self.lower,
+                                                       min((beta - others) / probabilities[index], self.upper))
+                probed_score = others + probabilities[index] * lower_bounds[index]
+                if probed_score >= beta:
+                    return self.cut(curr_node, probed_score)
+
+        # Star1, searched_score is the expectation over the searched children, the rest are bounded on both sides
+        searched_score = 0.0
+        remaining_probability = 1.0
+        remaining_lower = sum(x * y for x, y in zip(probabilities, lower_bounds))
+        for index, each_child in enumerate(children):
+            probability = probabilities[index]
+            remaining_probability -= probability
+            remaining_lower -= probability * lower_bounds[index]
+            child_alpha = (alpha - searched_score - remaining_probability * self.upper) / probability
+            child_beta = (beta - searched_score - remaining_lower) / probability
+            score = self.max_value(each_child, depth - 1, max(child_alpha, self.lower),
+                                   min(child_beta, self.upper))
+            searched_score += probability * score
+            if score <= child_alpha:
+                return self.cut(curr_node, searched_score + remaining_probability * self.upper)
+            if score >= child_beta:
+                return self.cut(curr_node, searched_score + remaining_lower)
+
+        curr_node.spec = GraphNodeType.EXPECTIMAX
+        curr_node.children = children
+        return searched_score
+
+
 def is_your_turn(player_side: CheckersPlayer, state: CheckersGraphNode) -> bool:
     return player_side == state.state.turn
 
@@ -851,39 +1996,87 @@ if __name__ == '__main__':
         case _:
             chosen_side = CheckersPlayer.BOTTOM
 
+    # the CPU plays this game with alpha-beta or with monte carlo tree search
+    CHOSEN_ENGINE_INPUT = ''
+    engines = set(['a', 'alphabeta', 'm', 'mcts', 'e', 'expectimax'])
+    while CHOSEN_ENGINE_INPUT not in engines:
+        CHOSEN_ENGINE_INPUT = input(
+            'Chose an engine: ' + ', '.join(sorted(engines)) + ' >>\t')
+    mcts = MonteCarloTreeSearch() if CHOSEN_ENGINE_INPUT in (
+        'm', 'mcts') else None
+    # plays against the user as a stochastic opponent, searching a sample of the user's likeliest replies
+    EXPECTIMAX_DEPTH = 6
+    EXPECTIMAX_SAMPLE_LIMIT = 4
+    # softmax temperature of the user's move choice, in heuristic points
+    EXPECTIMAX_TEMPERATURE = 4.0
+    expectimax = ExpectimaxSearch(temperature=EXPECTIMAX_TEMPERATURE, sample_limit=EXPECTIMAX_SAMPLE_LIMIT) if CHOSEN_ENGINE_INPUT in (
+        'e', 'expectimax') else None
+
     g: CheckersGraphNode = CheckersGraphNode(GraphNodeType.MAX)
     g.state = CheckersState(8, 8)
 
     # Adversarial network, calculates a strategy (policy) which recommends a move for the next state
     init_board(g.state)
+    # the user's turns are the max nodes of the tree
+    if not is_your_turn(chosen_side, g):
+        g.spec = GraphNodeType.MIN
+
+    # more than one worker searches the CPU's root moves in parallel at a fixed depth, instead of deepening on one core
+    CPU_WORKERS = 1
+    CPU_DEPTH = 8
+    CPU_TIME_BUDGET = 1.0
+    CPU_ALGORITHM = SearchAlgorithm.PVS
+    # built by running tablebase.py and opening_book.py
+    CPU_TABLEBASE_PATH = 'endgame_8x8.cktb'
+    CPU_BOOK_PATH = 'opening_8x8.ckob'
+    search = CheckersSearch(algorithm=CPU_ALGORITHM, aspiration_window=ASPIRATION_WINDOW,
+                            tablebase=EndgameTablebase(
+                                CPU_TABLEBASE_PATH) if os.path.exists(CPU_TABLEBASE_PATH) else None,
+                            book=OpeningBook(CPU_BOOK_PATH) if os.path.exists(CPU_BOOK_PATH) else None)
+    parallel_search = ParallelCheckersSearch(
+        CPU_WORKERS) if CPU_WORKERS > 1 else None
+
+    # the user's tree and its leaf scores are kept from one turn to the next, each build only extends the frontier
+    tree_table = TranspositionTable()
 
-    # TODO: Figure out why it is breaking when selecting a move
     while True:
-        recursive_deepening_dfs(g)
         if is_your_turn(chosen_side, g):
+            tree_table.new_search()
+            recursive_deepening_dfs(g, tree_table)
+            # scores the whole tree once, the children's scores below are then read from the cache
+            g.get_value()
             moves = []
             for ind, each_child in enumerate(g.children):
                 moves.append(
-                    f'{ind + 1}:\t{each_child.state.applied_move_str} [Score: {alphabeta_pruning(each_child)}]')
+                    f'{ind + 1}:\t{each_child.state.applied_move_str} [Score: {each_child.get_value()}]')
             print('\n'.join(moves))
             SELECTED_MOVE = 0
             available_moves = list(set(range(1, len(moves) + 1)))
             while SELECTED_MOVE not in available_moves:
                 SELECTED_MOVE = int(input('Select a move from the list  >>  '))
-            g.state = g.parent.state.process_move(
-                g.children[SELECTED_MOVE].state.applied_move) if g.parent is not None else g.state.process_move(
-                g.children[SELECTED_MOVE].state.applied_move)
+            g = reroot_tree(
+                g, g.children[SELECTED_MOVE - 1].state.applied_move)
+            if mcts is not None:
+                # keeps the subtree of the user's move for the next search
+                mcts.advance(g.state.applied_move)
         else:
-            # is CPUs turn, picks max
-            max_amt = float('-inf')
-            max_child: Optional[CheckersGraphNode] = None
-            for ind, each_child in enumerate(g.children):
-                val = alphabeta_pruning(each_child)
-                if val > max_amt:
-                    max_amt = val
-                    max_child = each_child
-            g.state = g.parent.state.process_move(
-                max_child.state.applied_move) if g.parent is not None else g.state.process_move(max_child.state.applied_move)
+            # is CPUs turn, picks max, deepens until the time budget is spent (unless the book knows the position)
+            booked = search.book_move(g.state)
+            if booked is not None:
+                _, best_move = booked
+            elif mcts is not None:
+                best_move = mcts.search(g.state, CPU_TIME_BUDGET)
+            elif expectimax is not None:
+                _, best_move = expectimax.search(CheckersGraphNode(
+                    GraphNodeType.MAX, state=g.state.clone()), EXPECTIMAX_DEPTH)
+            elif parallel_search is not None:
+                _, best_move = parallel_search.search(g.state, CPU_DEPTH)
+            else:
+                _, best_move = search.iterative_deepening(
+                    g.state, CPU_TIME_BUDGET)
+            g = reroot_tree(g, best_move)
+            if mcts is not None:
+                mcts.advance(best_move)
 
 
 """
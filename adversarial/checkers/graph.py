@@ -1,5 +1,8 @@
 from __future__ import annotations
-from typing import Optional, List, Any, TypeVar
+from typing import Optional, List, Any, TypeVar, Callable
+from array import array
+from collections import deque
+from copy import copy
 
 from enum import Enum
 
@@ -12,35 +15,323 @@ class GraphNodeType(Enum):
 
 
 class GraphNode:
+    """
+    A node of a min / max / expectimax game tree
+
+    get_value caches the value of every inner node it scores, the cache is dropped (for the node and its ancestors) when
+    the node's value, spec or children change, so children have to be changed through add_child / add_children or by
+    assigning a new list, not by mutating the list in place. All three make the node the children's parent, which is
+    how a change below a node reaches its cached value
+    """
+
     def __init__(self: GraphNode, value: int = -1) -> None:
-        self.value = value
-        self.spec: GraphNodeType = GraphNodeType.TERMINAL
-        self.children: List[GraphNode] = []
         self.parent: Optional[GraphNode] = None
+        self._cached_value: Optional[float] = None
+        self._value = value
+        self._spec: GraphNodeType = GraphNodeType.TERMINAL
+        self._children: List[GraphNode] = []
+        # weight of the node among the children of an EXPECTIMAX parent
+        self._probability = 1.0
+
+    @property
+    def value(self: GraphNode) -> int:
+        return self._value
+
+    @value.setter
+    def value(self: GraphNode, value: int) -> None:
+        self._value = value
+        self.invalidate_value()
+
+    @property
+    def spec(self: GraphNode) -> GraphNodeType:
+        return self._spec
+
+    @spec.setter
+    def spec(self: GraphNode, spec: GraphNodeType) -> None:
+        self._spec = spec
+        self.invalidate_value()
+
+    @property
+    def probability(self: GraphNode) -> float:
+        return self._probability
+
+    @probability.setter
+    def probability(self: GraphNode, probability: float) -> None:
+        self._probability = probability
+        self.invalidate_value()
+
+    @property
+    def children(self: GraphNode) -> List[GraphNode]:
+        return self._children
+
+    @children.setter
+    def children(self: GraphNode, children: List[GraphNode]) -> None:
+        # the children point back to the node, a change below it has to reach its cached value
+        for each_child in children:
+            each_child.parent = self
+        self._children = children
+        self.invalidate_value()
 
     def add_child(self: GraphNode, child: GraphNode) -> GraphNode:
-        self.children.append(child)
+        child.parent = self
+        self._children.append(child)
+        self.invalidate_value()
         return self
 
     def add_children(self: GraphNode, children: List[GraphNode]) -> GraphNode:
         for each_child in children:
-            self.children.append(each_child)
+            each_child.parent = self
+            self._children.append(each_child)
+        self.invalidate_value()
         return self
 
-    def get_value(self: GraphNode) -> int:
-        if self.spec == GraphNodeType.TERMINAL:
-            return self.value
-        if self.spec == GraphNodeType.MIN:
-            return min(x.get_value() for x in self.children)
-        if self.spec == GraphNodeType.MAX:
-            return max(x.get_value() for x in self.children)
-        if self.spec == GraphNodeType.EXPECTIMAX:
-            return sum(x.get_value() for x in self.children) // len(self.children)
+    def invalidate_value(self: GraphNode) -> None:
+        """
+        Drops the cached value of the node and of its ancestors, an ancestor is only cached while all of its descendants
+        are, so the walk stops at the first one that is not
+        """
+        self._cached_value = None
+        node = self.parent
+        while node is not None and node._cached_value is not None:
+            node._cached_value = None
+            node = node.parent
+
+    def combine_values(self: GraphNode, values: List[float]) -> float:
+        # the values are the children's, in order
+        if not values:
+            # a node without moves is a leaf of the game, it has to be made TERMINAL with its own value
+            raise ValueError(f'A {self._spec.name} node without children has no value')
+        if self._spec == GraphNodeType.MIN:
+            return min(values)
+        if self._spec == GraphNodeType.MAX:
+            return max(values)
+        if self._spec == GraphNodeType.EXPECTIMAX:
+            # the children's probabilities are normalized here, so they only have to be relative weights
+            total = sum(x._probability for x in self._children)
+            return sum(x._probability * y for x, y in zip(self._children, values)) / total
         return 0
 
+    def get_value(self: GraphNode) -> float:
+        """
+        The min / max / expectimax value of the node, computed bottom up with an explicit stack (deep trees do not hit
+        the recursion limit) and cached, scoring the node again is O(1) until the subtree changes
+        """
+        if self._spec == GraphNodeType.TERMINAL:
+            return self._value
+        if self._cached_value is not None:
+            return self._cached_value
+
+        pending: List[tuple[GraphNode, bool]] = [(self, False)]
+        while pending:
+            node, children_scored = pending.pop()
+            if node._cached_value is not None:
+                continue
+            if not children_scored:
+                pending.append((node, True))
+                pending.extend((x, False) for x in node._children
+                               if x._spec != GraphNodeType.TERMINAL and x._cached_value is None)
+                continue
+            node._cached_value = node.combine_values(
+                [x._value if x._spec == GraphNodeType.TERMINAL else x._cached_value for x in node._children])
+        return self._cached_value
+
     def clone(self: GraphNode) -> GraphNode:
-        cloned = GraphNode(self.value)
-        cloned.spec = self.spec
-        cloned.children = [x.clone() for x in self.children]
-        cloned.parent = self.parent.clone() if self.parent is not None else None
-        return cloned
+        """
+        Copies the subtree of the node without recursion, linear in its size: every copied child points to its copied
+        parent, the copy of the node keeps the node's parent (the ancestors are shared, not copied) and attributes of
+        subclasses (such as a CheckersGraphNode's state) are shared by the copies
+        """
+        cloned_root = copy(self)
+        pending = [cloned_root]
+        while pending:
+            cloned = pending.pop()
+            cloned_children = [copy(x) for x in cloned._children]
+            for each_child in cloned_children:
+                each_child.parent = cloned
+            cloned._children = cloned_children
+            pending.extend(cloned_children)
+        return cloned_root
+
+
+# GraphNodeType <-> the code stored in GraphArena.specs
+GRAPH_NODE_TYPES: List[GraphNodeType] = list(GraphNodeType)
+GRAPH_NODE_CODES = {x: ind for ind, x in enumerate(GRAPH_NODE_TYPES)}
+
+
+class GraphArena:
+    """
+    Stores a whole game tree in parallel arrays instead of one GraphNode object per node: node i has its parent,
+    first child and # of children in `parents`, `first_children` and `child_counts`, its type and value in `specs` and
+    `values`, and the move that reached it in `moves` (an integer code chosen by the caller, -1 when there is none)
+
+    The children of a node are added together and stored next to each other, always after their parent, so a node's
+    children are the range first_child ... first_child + child_count and walking the indexes backwards visits every
+    child before its parent
+
+    Arguments:
+        self (GraphArena): The internal state
+    """
+
+    def __init__(self: GraphArena) -> None:
+        self.parents = array('i')
+        self.first_children = array('i')
+        self.child_counts = array('i')
+        self.specs = array('b')
+        self.values = array('d')
+        self.moves = array('q')
+
+    def __len__(self: GraphArena) -> int:
+        return len(self.specs)
+
+    def add_node(self: GraphArena, parent: int, spec: GraphNodeType, value: float, move: int) -> int:
+        self.parents.append(parent)
+        self.first_children.append(-1)
+        self.child_counts.append(0)
+        self.specs.append(GRAPH_NODE_CODES[spec])
+        self.values.append(value)
+        self.moves.append(move)
+        return len(self.specs) - 1
+
+    def add_root(self: GraphArena, spec: GraphNodeType = GraphNodeType.MAX, value: float = -1, move: int = -1) -> int:
+        return self.add_node(-1, spec, value, move)
+
+    def add_children(self: GraphArena, parent: int, specs: List[GraphNodeType], values: List[float], moves: Optional[List[int]] = None) -> range:
+        """
+        Adds every child of the node in one block
+
+        Returns:
+            The indexes of the children
+        """
+        if self.child_counts[parent]:
+            raise ValueError(f'Node {parent} already has children')
+        first_child = len(self.specs)
+        for ind, each_spec in enumerate(specs):
+            self.add_node(parent, each_spec,
+                          values[ind], moves[ind] if moves is not None else -1)
+        self.first_children[parent] = first_child
+        self.child_counts[parent] = len(specs)
+        return range(first_child, first_child + len(specs))
+
+    def children(self: GraphArena, index: int) -> range:
+        first_child = self.first_children[index]
+        return range(first_child, first_child + self.child_counts[index])
+
+    def spec(self: GraphArena, index: int) -> GraphNodeType:
+        return GRAPH_NODE_TYPES[self.specs[index]]
+
+    def node(self: GraphArena, index: int) -> ArenaNode:
+        return ArenaNode(self, index)
+
+    def get_value(self: GraphArena, index: int = 0) -> float:
+        """
+        The min / max / expectimax value of the node, same as GraphNode.get_value, computed without recursion over the
+        node's subtree only: its inner nodes are listed parents first and scored in reverse (the values of the inner
+        nodes are updated, so the children's views can read theirs from `values` afterwards)
+        """
+        values = self.values
+        terminal = GRAPH_NODE_CODES[GraphNodeType.TERMINAL]
+        minimum = GRAPH_NODE_CODES[GraphNodeType.MIN]
+        maximum = GRAPH_NODE_CODES[GraphNodeType.MAX]
+        expectimax = GRAPH_NODE_CODES[GraphNodeType.EXPECTIMAX]
+        inner_nodes: List[int] = []
+        pending = [index]
+        while pending:
+            each_index = pending.pop()
+            if self.specs[each_index] == terminal:
+                continue
+            if not self.child_counts[each_index]:
+                raise ValueError(
+                    f'A {self.spec(each_index).name} node without children has no value')
+            inner_nodes.append(each_index)
+            pending.extend(self.children(each_index))
+
+        for each_index in reversed(inner_nodes):
+            spec = self.specs[each_index]
+            count = self.child_counts[each_index]
+            first_child = self.first_children[each_index]
+            children_values = values[first_child:first_child + count]
+            if spec == minimum:
+                values[each_index] = min(children_values)
+            elif spec == maximum:
+                values[each_index] = max(children_values)
+            elif spec == expectimax:
+                # the arena keeps no probabilities, the children are equally likely
+                values[each_index] = sum(children_values) / count
+        return values[index]
+
+    @staticmethod
+    def from_graph(root: GraphNode, move_of: Optional[Callable[[GraphNode], int]] = None) -> GraphArena:
+        """
+        Copies a GraphNode tree into an arena, breadth first, the root is node 0
+
+        Arguments:
+            root (GraphNode): The root of the tree
+            move_of (Optional[Callable[[GraphNode], int]]): Gives the move code stored for each node, no moves are stored if not given
+        """
+        arena = GraphArena()
+        arena.add_root(root.spec, root.value,
+                       move_of(root) if move_of is not None else -1)
+        pending = deque([(0, root)])
+        while pending:
+            index, node = pending.popleft()
+            if not node.children:
+                continue
+            children = arena.add_children(index, [x.spec for x in node.children], [x.value for x in node.children],
+                                          [move_of(x) for x in node.children] if move_of is not None else None)
+            pending.extend(zip(children, node.children))
+        return arena
+
+
+class ArenaNode:
+    """
+    GraphNode compatible view of one node of a GraphArena (value, spec, children, parent and get_value), views are
+    created on access and hold no data of their own
+
+    Arguments:
+        self (ArenaNode): The internal state
+        arena (GraphArena): The arena holding the node
+        index (int): The index of the node in the arena
+    """
+    __slots__ = ('arena', 'index')
+
+    def __init__(self: ArenaNode, arena: GraphArena, index: int) -> None:
+        self.arena = arena
+        self.index = index
+
+    @property
+    def value(self: ArenaNode) -> float:
+        return self.arena.values[self.index]
+
+    @value.setter
+    def value(self: ArenaNode, value: float) -> None:
+        self.arena.values[self.index] = value
+
+    @property
+    def spec(self: ArenaNode) -> GraphNodeType:
+        return self.arena.spec(self.index)
+
+    @spec.setter
+    def spec(self: ArenaNode, spec: GraphNodeType) -> None:
+        self.arena.specs[self.index] = GRAPH_NODE_CODES[spec]
+
+    @property
+    def move(self: ArenaNode) -> int:
+        return self.arena.moves[self.index]
+
+    @property
+    def children(self: ArenaNode) -> List[ArenaNode]:
+        return [ArenaNode(self.arena, x) for x in self.arena.children(self.index)]
+
+    @property
+    def parent(self: ArenaNode) -> Optional[ArenaNode]:
+        parent = self.arena.parents[self.index]
+        return ArenaNode(self.arena, parent) if parent >= 0 else None
+
+    def get_value(self: ArenaNode) -> float:
+        return self.arena.get_value(self.index)
+
+    def __eq__(self: ArenaNode, other: object) -> bool:
+        return isinstance(other, ArenaNode) and other.arena is self.arena and other.index == self.index
+
+    def __hash__(self: ArenaNode) -> int:
+        return hash((id(self.arena), self.index))
@@ -0,0 +1,196 @@
+from __future__ import annotations
+from typing import Any, Optional
+from math import log, sqrt
+from random import Random
+from time import perf_counter
+
+
+# exploration constant of UCB1
+UCT_EXPLORATION = sqrt(2)
+
+# rollouts longer than this are stopped and decided by the heuristic
+ROLLOUT_PLY_LIMIT = 120
+
+
+class MCTSNode:
+    """
+    A node of the Monte Carlo search tree, reached by playing `move`
+
+    Arguments:
+        self (MCTSNode): The internal state
+        move (Any): The move that leads to the node (None for the root)
+        parent (Optional[MCTSNode]): The node the move was played from
+        player (Any): The player who played the move, rewards are counted from its perspective
+        key (int): The zobrist hash of the position after the move
+    """
+    __slots__ = ('move', 'parent', 'player', 'key',
+                 'children', 'untried', 'visits', 'reward')
+
+    def __init__(self: MCTSNode, move: Any, parent: Optional[MCTSNode], player: Any, key: int) -> None:
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.key = key
+        self.children: list[MCTSNode] = []
+        # moves not expanded yet, generated the first time the node is selected
+        self.untried: Optional[list[Any]] = None
+        self.visits = 0
+        self.reward = 0.0
+
+    def uct_child(self: MCTSNode, exploration: float) -> MCTSNode:
+        log_visits = log(self.visits)
+        return max(self.children, key=lambda x: x.reward / x.visits + exploration * sqrt(log_visits / x.visits))
+
+
+class MonteCarloTreeSearch:
+    """
+    UCT search over any state with the CheckersState interface (clone, generate_potential_moves, make_move,
+    unmake_move, opponent_of, generate_heuristic, turn and hash)
+
+    The tree is kept between calls: advance() moves the root to the child of the played move, so the statistics below
+    it are reused on the next search
+
+    Arguments:
+        self (MonteCarloTreeSearch): The internal state
+        exploration (float): The exploration constant of UCB1
+        heuristic_rollouts (bool): Whether rollouts play the move with the best heuristic instead of a random one
+        rollout_limit (int): The # of plies after which a rollout is decided by the heuristic
+        seed (Optional[int]): The seed of the rollouts
+
+    Returns:
+        The search instance
+    """
+
+    def __init__(self: MonteCarloTreeSearch, exploration: float = UCT_EXPLORATION, heuristic_rollouts: bool = False, rollout_limit: int = ROLLOUT_PLY_LIMIT, seed: Optional[int] = None) -> None:
+        self.exploration = exploration
+        self.heuristic_rollouts = heuristic_rollouts
+        self.rollout_limit = rollout_limit
+        self.generator = Random(seed)
+        self.root: Optional[MCTSNode] = None
+        self.iterations = 0
+        self.stopped = False
+
+    def search(self: MonteCarloTreeSearch, state: Any, time_budget: Optional[float] = 1.0, iteration_budget: Optional[int] = None) -> Optional[Any]:
+        """
+        Runs iterations until the time (seconds) or iteration budget is spent or stop() is called, at least one
+        iteration always runs
+
+        Returns:
+            The most visited move of the root, None if the game is over
+        """
+        if self.root is None or self.root.key != state.hash:
+            self.root = MCTSNode(None, None, None, state.hash)
+        self.stopped = False
+        self.iterations = 0
+        working_state = state.clone()
+        deadline = perf_counter() + time_budget if time_budget is not None else None
+
+        while True:
+            self.iterate(working_state)
+            self.iterations += 1
+            if self.stopped or (iteration_budget is not None and self.iterations >= iteration_budget):
+                break
+            if deadline is not None and perf_counter() >= deadline:
+                break
+
+        if not self.root.children:
+            return None
+        return max(self.root.children, key=lambda x: x.visits).move
+
+    def stop(self: MonteCarloTreeSearch) -> None:
+        """
+        Ends the running search after the current iteration, the best move so far is returned
+        """
+        self.stopped = True
+
+    def advance(self: MonteCarloTreeSearch, move: Any) -> None:
+        """
+        Moves the root to the child reached by the played move, dropping the rest of the tree
+        """
+        if self.root is None:
+            return
+        for each_child in self.root.children:
+            if each_child.move == move:
+                each_child.parent = None
+                self.root = each_child
+                return
+        self.root = None
+
+    def iterate(self: MonteCarloTreeSearch, state: Any) -> None:
+        """
+        One selection, expansion, rollout and backpropagation pass, the state is restored afterwards
+        """
+        undo_tokens: list[tuple] = []
+        node = self.root
+
+        # selection
+        while True:
+            if node.untried is None:
+                node.untried = list(state.generate_potential_moves())
+                self.generator.shuffle(node.untried)
+            if node.untried or not node.children:
+                break
+            node = node.uct_child(self.exploration)
+            undo_tokens.append(state.make_move(node.move))
+
+        # expansion
+        if node.untried:
+            move = node.untried.pop()
+            player = state.turn
+            undo_tokens.append(state.make_move(move))
+            child = MCTSNode(move, node, player, state.hash)
+            node.children.append(child)
+            node = child
+
+        winner = self.rollout(state, undo_tokens)
+        for each_token in reversed(undo_tokens):
+            state.unmake_move(each_token)
+
+        # backpropagation, every node is scored for the player who moved into it
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.reward += 0.5
+            elif winner == node.player:
+                node.reward += 1
+            node = node.parent
+
+    def rollout(self: MonteCarloTreeSearch, state: Any, undo_tokens: list[tuple]) -> Optional[Any]:
+        """
+        Plays the game out from the state, the played moves are appended to the undo tokens
+
+        Returns:
+            The winning player, None for a draw
+        """
+        for _ in range(self.rollout_limit):
+            moves = state.generate_potential_moves()
+            if not moves:
+                # the player to move has no pieces or no moves left
+                return state.opponent_of(state.turn)
+            if self.heuristic_rollouts:
+                move = self.best_heuristic_move(state, moves)
+            else:
+                move = moves[self.generator.randrange(len(moves))]
+            undo_tokens.append(state.make_move(move))
+
+        player = state.turn
+        opponent = state.opponent_of(player)
+        player_score = state.generate_heuristic(player)
+        opponent_score = state.generate_heuristic(opponent)
+        if player_score == opponent_score:
+            return None
+        return player if player_score > opponent_score else opponent
+
+    def best_heuristic_move(self: MonteCarloTreeSearch, state: Any, moves: list[Any]) -> Any:
+        player = state.turn
+        best_score, best_moves = float('-inf'), []
+        for each_move in moves:
+            undo_token = state.make_move(each_move)
+            score = state.generate_heuristic(player)
+            state.unmake_move(undo_token)
+            if score > best_score:
+                best_score, best_moves = score, [each_move]
+            elif score == best_score:
+                best_moves.append(each_move)
+        # ties are broken at random so rollouts still differ
+        return best_moves[self.generator.randrange(len(best_moves))]
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from typing import Optional
+import mmap
+import struct
+
+
+OPENING_BOOK_MAGIC = b'CKOB'
+OPENING_BOOK_VERSION = 2
+
+# magic, version, rows, cols, # of records
+HEADER_FORMAT = '<4sHBBI'
+# zobrist hash of the position, index of the move in the position's generate_potential_moves (from / to squares do not
+# tell apart two capture sequences between the same squares), score of the move for the player to move
+RECORD_FORMAT = '<QHi'
+
+
+class OpeningBook:
+    """
+    Read only, memory mapped opening book written by write_opening_book, records are sorted by hash and looked up with
+    a binary search, nothing is loaded up front
+
+    Arguments:
+        self (OpeningBook): The internal state
+        path (str): The opening book file
+
+    Returns:
+        The opening book instance
+    """
+
+    def __init__(self: OpeningBook, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.count = struct.unpack_from(
+            HEADER_FORMAT, self.data, 0)
+        if magic != OPENING_BOOK_MAGIC or version != OPENING_BOOK_VERSION:
+            self.close()
+            raise ValueError(
+                f'{path} is not a version {OPENING_BOOK_VERSION} checkers opening book')
+        self.records_offset = struct.calcsize(HEADER_FORMAT)
+        self.record_size = struct.calcsize(RECORD_FORMAT)
+        self.hits = 0
+
+    def lookup(self: OpeningBook, rows: int, cols: int, key: int) -> Optional[tuple[int, int]]:
+        """
+        Finds the book move of the position with the zobrist hash `key`
+
+        Returns:
+            The (move index, score) of the move, None if the position is out of book
+        """
+        if rows != self.rows or cols != self.cols:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record = struct.unpack_from(
+                RECORD_FORMAT, self.data, self.records_offset + middle * self.record_size)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                self.hits += 1
+                return record[1], record[2]
+        return None
+
+    def __len__(self: OpeningBook) -> int:
+        return self.count
+
+    def close(self: OpeningBook) -> None:
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self: OpeningBook) -> OpeningBook:
+        return self
+
+    def __exit__(self: OpeningBook, *args) -> None:
+        self.close()
+
+
+def write_opening_book(path: str, rows: int, cols: int, entries: dict[int, tuple[int, int]]) -> None:
+    """
+    Writes hash -> (move index, score) entries sorted by hash
+    """
+    with open(path, 'wb') as book_file:
+        book_file.write(struct.pack(HEADER_FORMAT, OPENING_BOOK_MAGIC,
+                        OPENING_BOOK_VERSION, rows, cols, len(entries)))
+        for each_key in sorted(entries.keys()):
+            book_file.write(struct.pack(
+                RECORD_FORMAT, each_key, *entries[each_key]))
+
+
+def build_opening_book(path: str, rows: int = 8, cols: int = 8, plies: int = 4, depth: int = 8) -> int:
+    """
+    Searches every position reachable within `plies` moves of the init_board position (with either player to move
+    first) `depth` plies deep and writes the best move of each one
+
+    Returns:
+        The # of positions in the book
+    """
+    # the engine imports this module for the lookup, so it is only imported once a book is built
+    from checkers import CheckersPlayer, CheckersSearch, CheckersState, SearchAlgorithm, init_board
+
+    search = CheckersSearch(algorithm=SearchAlgorithm.PVS)
+    entries: dict[int, tuple[int, int]] = {}
+    frontier: list[CheckersState] = []
+    for each_player in (CheckersPlayer.BOTTOM, CheckersPlayer.TOP):
+        frontier.append(init_board(CheckersState(rows, cols, each_player)))
+
+    for _ in range(plies):
+        next_frontier: list[CheckersState] = []
+        for each_state in frontier:
+            if each_state.hash in entries:
+                continue
+            score, move = search.search(each_state, depth)
+            if move is None:
+                continue
+            moves = each_state.generate_potential_moves()
+            entries[each_state.hash] = (moves.index(move), int(score))
+            # every reply is expanded, the book has to answer whatever the opponent plays
+            next_frontier.extend(each_state.process_move(x) for x in moves)
+        frontier = next_frontier
+
+    write_opening_book(path, rows, cols, entries)
+    return len(entries)
+
+
+if __name__ == '__main__':
+    OPENING_BOOK_ROWS = 8
+    OPENING_BOOK_COLS = 8
+    build_opening_book(f'opening_{OPENING_BOOK_ROWS}x{OPENING_BOOK_COLS}.ckob',
+                       OPENING_BOOK_ROWS, OPENING_BOOK_COLS)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+from typing import Optional
+from time import perf_counter
+
+from checkers import CheckersPlayer, CheckersState, init_board
+
+
+class PerftPosition:
+    """
+    A fixed position of the perft suite with its expected move path counts (published or engine generated)
+
+    Arguments:
+        self (PerftPosition): The internal state
+        name (str): The name of the position
+        rows (int): The # of rows in the board
+        cols (int): The # of columns in the board
+        turn (CheckersPlayer): The player to move
+        counts (list[int]): The perft counts of depth 1, 2, 3...
+        board (Optional[list[str]]): One string per row, '.' empty, 'b' / 'B' bottom man / king, 't' / 'T' top man /
+            king, the init_board position when not given
+
+    Returns:
+        The perft position instance
+    """
+
+    def __init__(self: PerftPosition, name: str, rows: int, cols: int, turn: CheckersPlayer, counts: list[int], board: Optional[list[str]] = None) -> None:
+        self.name = name
+        self.rows = rows
+        self.cols = cols
+        self.turn = turn
+        self.counts = counts
+        self.board = board
+
+    def state(self: PerftPosition) -> CheckersState:
+        state = CheckersState(self.rows, self.cols, self.turn)
+        if self.board is None:
+            return init_board(state)
+        pieces = {'b': (CheckersPlayer.BOTTOM, False), 'B': (CheckersPlayer.BOTTOM, True),
+                  't': (CheckersPlayer.TOP, False), 'T': (CheckersPlayer.TOP, True)}
+        for y, each_row in enumerate(self.board):
+            for x, each_square in enumerate(each_row):
+                if each_square in pieces:
+                    owner, is_king = pieces[each_square]
+                    state.place_piece(owner, x, y, is_king)
+        return state
+
+
+PERFT_POSITIONS: list[PerftPosition] = [
+    # the published counts of the 8x8 starting position
+    PerftPosition('start', 8, 8, CheckersPlayer.BOTTOM,
+                  [7, 49, 302, 1469, 7361, 36768, 179740, 845931]),
+    # engine generated regression counts (not published): kings and men of both sides spread over the board
+    PerftPosition('kings', 8, 8, CheckersPlayer.BOTTOM,
+                  [10, 58, 365, 2640, 16344, 119563, 735285],
+                  ['...T....',
+                   '........',
+                   '.B.....t',
+                   '........',
+                   '...T....',
+                   'B.......',
+                   '.....B..',
+                   '..T.....']),
+    # engine generated regression counts (not published): mostly multi-jump chains, with a king that can capture
+    # both ways
+    PerftPosition('captures', 8, 8, CheckersPlayer.BOTTOM,
+                  [10, 32, 162, 873, 4578, 24206, 126361],
+                  ['.......T',
+                   '....t...',
+                   '........',
+                   '..t.t.t.',
+                   '........',
+                   '..t.t...',
+                   '.b.B.b..',
+                   'b.......']),
+    # engine generated regression counts (not published) of the 10x10 starting position, with these rules rather than
+    # international draughts
+    PerftPosition('start_10x10', 10, 10, CheckersPlayer.BOTTOM,
+                  [9, 81, 658, 4265, 26875, 164406, 1016158]),
+]
+
+
+def perft(state: CheckersState, depth: int) -> int:
+    """
+    Counts the move paths `depth` plies deep, the state is walked with make_move/unmake_move and left as it was
+    """
+    moves = state.generate_potential_moves()
+    if depth <= 1:
+        # the last ply is counted without being played
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for each_move in moves:
+        undo_token = state.make_move(each_move)
+        nodes += perft(state, depth - 1)
+        state.unmake_move(undo_token)
+    return nodes
+
+
+def divide(state: CheckersState, depth: int) -> dict[str, int]:
+    """
+    The perft count below every root move, used to find which move a wrong count comes from
+    """
+    counts: dict[str, int] = {}
+    for each_move in state.generate_potential_moves():
+        undo_token = state.make_move(each_move)
+        counts[str(each_move)] = perft(state, depth - 1)
+        state.unmake_move(undo_token)
+    return counts
+
+
+def verify_perft(positions: list[PerftPosition] = PERFT_POSITIONS, max_depth: Optional[int] = None) -> list[tuple[str, int, int, int]]:
+    """
+    Checks the move generator against the expected counts of every position
+
+    Returns:
+        The (position, depth, expected, counted) of every mismatch, empty when the generator is correct
+    """
+    mismatches: list[tuple[str, int, int, int]] = []
+    for each_position in positions:
+        state = each_position.state()
+        for depth, expected in enumerate(each_position.counts[:max_depth], start=1):
+            counted = perft(state, depth)
+            if counted != expected:
+                mismatches.append(
+                    (each_position.name, depth, expected, counted))
+    return mismatches
+
+
+def benchmark_perft(positions: list[PerftPosition] = PERFT_POSITIONS, depth: int = 6) -> list[dict]:
+    """
+    Times perft at `depth` on every position
+
+    Returns:
+        The position, depth, counted move paths, seconds and move paths per second of every position
+    """
+    timings: list[dict] = []
+    for each_position in positions:
+        state = each_position.state()
+        started = perf_counter()
+        nodes = perft(state, depth)
+        elapsed = perf_counter() - started
+        timings.append({'position': each_position.name, 'depth': depth, 'nodes': nodes,
+                        'seconds': elapsed, 'nodes_per_second': nodes / elapsed if elapsed else 0.0})
+    return timings
+
+
+if __name__ == '__main__':
+    PERFT_BENCHMARK_DEPTH = 6
+    PERFT_DIVIDE_DEPTH = 4
+    print('\n'.join(f'{x}: {y}' for x, y in divide(
+        PERFT_POSITIONS[0].state(), PERFT_DIVIDE_DEPTH).items()))
+    failed = verify_perft()
+    for (name, depth, expected, counted) in failed:
+        print(f'{name} perft({depth}): expected {expected}, counted {counted}')
+    print('perft counts match' if not failed else f'{len(failed)} perft counts differ')
+    for each_timing in benchmark_perft(depth=PERFT_BENCHMARK_DEPTH):
+        print('{position} perft({depth}) = {nodes} in {seconds:.3f}s ({nodes_per_second:.0f} nodes/s)'.format(
+            **each_timing))
@@ -0,0 +1,238 @@
+from __future__ import annotations
+from typing import Iterator, NamedTuple, Optional
+import mmap
+import struct
+
+from transposition import TranspositionBound
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional, without it the trace is only read record by record
+    np = None
+
+
+SEARCH_TRACE_MAGIC = b'CKST'
+SEARCH_TRACE_VERSION = 1
+
+# magic, version, rows, cols, the # of records follows from the file size
+HEADER_FORMAT = '<4sHBB'
+# zobrist hash, parent record (-1 for the root), from square, to square, ply, remaining depth, score, bound, flags
+RECORD_FORMAT = '<QiHHHhfBB'
+# score, bound and flags, filled in once the node is searched
+RESULT_FORMAT = '<fBB'
+RESULT_OFFSET = struct.calcsize(RECORD_FORMAT) - struct.calcsize(RESULT_FORMAT)
+
+# from / to square of the root, which is not reached by a move
+NO_SQUARE = 0xFFFF
+
+# the node failed high for the player to move in it
+TRACE_CUTOFF = 1
+# the node was not finished, the search was stopped while it was being searched
+TRACE_INCOMPLETE = 2
+
+# the numpy dtype of a record, for column queries over the whole file
+if np is not None:
+    RECORD_DTYPE = np.dtype([('key', '<u8'), ('parent', '<i4'), ('from_square', '<u2'), ('to_square', '<u2'),
+                             ('ply', '<u2'), ('depth', '<i2'), ('score', '<f4'), ('bound', 'u1'), ('flags', 'u1')])
+
+
+class TraceRecord(NamedTuple):
+    key: int
+    parent: int
+    from_square: int
+    to_square: int
+    ply: int
+    depth: int
+    score: float
+    bound: TranspositionBound
+    flags: int
+
+    @property
+    def cutoff(self: TraceRecord) -> bool:
+        return bool(self.flags & TRACE_CUTOFF)
+
+
+class SearchTraceWriter:
+    """
+    Streams the nodes of a search to disk as fixed size records, in the order the search enters them (a parent is
+    always written before its children). A node is written when it is entered and its score, bound and flags are filled
+    in when it is left, in the buffer if it is still there or in place in the file otherwise, so only the last
+    `buffer_records` records are kept in memory
+
+    Arguments:
+        self (SearchTraceWriter): The internal state
+        path (str): The trace file, overwritten
+        rows (int): The # of rows in the board
+        cols (int): The # of columns in the board
+        buffer_records (int): The # of records written to the file at once
+
+    Returns:
+        The writer instance
+    """
+
+    def __init__(self: SearchTraceWriter, path: str, rows: int, cols: int, buffer_records: int = 1 << 16) -> None:
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(struct.pack(HEADER_FORMAT, SEARCH_TRACE_MAGIC,
+                        SEARCH_TRACE_VERSION, rows, cols))
+        self.records_offset = struct.calcsize(HEADER_FORMAT)
+        self.record_size = struct.calcsize(RECORD_FORMAT)
+        self.buffer_records = buffer_records
+        self.buffer = bytearray()
+        # the index of the first record in the buffer
+        self.flushed = 0
+        self.count = 0
+
+    def begin(self: SearchTraceWriter, key: int, parent: int, from_square: int, to_square: int, ply: int, depth: int) -> int:
+        """
+        Writes a node as it is entered, marked incomplete until end is called
+
+        Returns:
+            The index of the node's record, the parent of its children
+        """
+        self.buffer += struct.pack(RECORD_FORMAT, key, parent, from_square, to_square, ply, depth, 0.0,
+                                   TranspositionBound.EXACT.value, TRACE_INCOMPLETE)
+        index = self.count
+        self.count += 1
+        if self.count - self.flushed >= self.buffer_records:
+            self.flush()
+        return index
+
+    def end(self: SearchTraceWriter, index: int, score: float, bound: TranspositionBound, flags: int = 0) -> None:
+        """
+        Fills in the result of a node once it is searched
+        """
+        result = struct.pack(RESULT_FORMAT, score, bound.value, flags)
+        if index >= self.flushed:
+            offset = (index - self.flushed) * self.record_size + RESULT_OFFSET
+            self.buffer[offset:offset + len(result)] = result
+            return
+        # the node's subtree did not fit in the buffer, its record is already in the file
+        self.file.seek(self.records_offset + index *
+                       self.record_size + RESULT_OFFSET)
+        self.file.write(result)
+        self.file.seek(0, 2)
+
+    def flush(self: SearchTraceWriter) -> None:
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer = bytearray()
+        self.flushed = self.count
+
+    def __len__(self: SearchTraceWriter) -> int:
+        return self.count
+
+    def close(self: SearchTraceWriter) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self: SearchTraceWriter) -> SearchTraceWriter:
+        return self
+
+    def __exit__(self: SearchTraceWriter, *args) -> None:
+        self.close()
+
+
+class SearchTrace:
+    """
+    Read only, memory mapped search trace written by SearchTraceWriter, records are decoded when they are read so
+    traces larger than memory can be queried
+
+    Arguments:
+        self (SearchTrace): The internal state
+        path (str): The trace file
+
+    Returns:
+        The search trace instance
+    """
+
+    def __init__(self: SearchTrace, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols = struct.unpack_from(
+            HEADER_FORMAT, self.data, 0)
+        if magic != SEARCH_TRACE_MAGIC or version != SEARCH_TRACE_VERSION:
+            self.close()
+            raise ValueError(
+                f'{path} is not a version {SEARCH_TRACE_VERSION} checkers search trace')
+        self.records_offset = struct.calcsize(HEADER_FORMAT)
+        self.record_size = struct.calcsize(RECORD_FORMAT)
+        self.count = (len(self.data) - self.records_offset) // self.record_size
+
+    def __len__(self: SearchTrace) -> int:
+        return self.count
+
+    def __getitem__(self: SearchTrace, index: int) -> TraceRecord:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f'Record {index} is not in the trace')
+        record = struct.unpack_from(
+            RECORD_FORMAT, self.data, self.records_offset + index * self.record_size)
+        return TraceRecord(*record[:7], TranspositionBound(record[7]), record[8])
+
+    def parent_of(self: SearchTrace, index: int) -> int:
+        return struct.unpack_from('<i', self.data, self.records_offset + index * self.record_size + 8)[0]
+
+    def records(self: SearchTrace, start: int = 0, stop: Optional[int] = None) -> Iterator[TraceRecord]:
+        for index in range(start, self.count if stop is None else min(stop, self.count)):
+            yield self[index]
+
+    def subtree_end(self: SearchTrace, index: int) -> int:
+        """
+        The index after the last record of the node's subtree, records are in the order nodes are entered so a subtree
+        is contiguous and ends at the first record whose parent comes before the node
+        """
+        end = index + 1
+        while end < self.count and self.parent_of(end) >= index:
+            end += 1
+        return end
+
+    def children(self: SearchTrace, index: int) -> list[int]:
+        return [x for x in range(index + 1, self.subtree_end(index)) if self.parent_of(x) == index]
+
+    def columns(self: SearchTrace):
+        """
+        The records as a read only numpy structured array, memory mapped from the file on its own (nothing is copied)
+        so it outlives close, None without numpy
+        """
+        if np is None:
+            return None
+        if not self.count:
+            # numpy cannot map an empty range
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', offset=self.records_offset, shape=(self.count,))
+
+    def close(self: SearchTrace) -> None:
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self: SearchTrace) -> SearchTrace:
+        return self
+
+    def __exit__(self: SearchTrace, *args) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    SEARCH_TRACE_PATH = 'search_8x8.ckst'
+    SEARCH_TRACE_TIME_BUDGET = 1.0
+    # the engine imports this module for the writer, so it is only imported when a search is traced from here
+    from checkers import CheckersPlayer, CheckersSearch, CheckersState, SearchAlgorithm, init_board
+
+    state = init_board(CheckersState(8, 8, CheckersPlayer.BOTTOM))
+    with SearchTraceWriter(SEARCH_TRACE_PATH, state.rows, state.cols) as writer:
+        CheckersSearch(algorithm=SearchAlgorithm.PVS, trace=writer).iterative_deepening(
+            state, SEARCH_TRACE_TIME_BUDGET)
+
+    with SearchTrace(SEARCH_TRACE_PATH) as trace:
+        plies: dict[int, list[int]] = {}
+        for each_record in trace.records():
+            counts = plies.setdefault(each_record.ply, [0, 0])
+            counts[0] += 1
+            counts[1] += each_record.cutoff
+        print(f'{len(trace)} nodes traced to {SEARCH_TRACE_PATH}')
+        for each_ply, (nodes, cutoffs) in sorted(plies.items()):
+            print(f'ply {each_ply}: {nodes} nodes, {cutoffs / nodes:.1%} cut off')
@@ -0,0 +1,200 @@
+from __future__ import annotations
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from time import perf_counter
+import json
+
+from checkers import CheckersMove, CheckersPlayer, CheckersSearch, CheckersState, SearchAlgorithm, init_board
+from mcts import MonteCarloTreeSearch
+
+
+class SelfPlayEngine:
+    """
+    One side of a self-play game, an alpha-beta / pvs search (fixed depth, or iterative deepening under a time budget
+    when no depth is given) or monte carlo tree search (under the time budget)
+
+    Arguments:
+        self (SelfPlayEngine): The internal state
+        kind (str): 'alphabeta', 'pvs' or 'mcts'
+        depth (Optional[int]): The fixed search depth (alphabeta and pvs only)
+        time_budget (float): Seconds per move
+        seed (Optional[int]): The seed of the mcts rollouts
+
+    Returns:
+        The engine instance
+    """
+
+    def __init__(self: SelfPlayEngine, kind: str = 'pvs', depth: Optional[int] = 4, time_budget: float = 0.1, seed: Optional[int] = None) -> None:
+        if kind not in ('alphabeta', 'pvs', 'mcts'):
+            raise ValueError(f'Unknown engine {kind}')
+        self.kind = kind
+        self.depth = depth
+        self.time_budget = time_budget
+        self.seed = seed
+        self.search: Optional[CheckersSearch] = None
+        self.mcts: Optional[MonteCarloTreeSearch] = None
+        self.reset()
+
+    def reset(self: SelfPlayEngine) -> None:
+        """
+        Starts a new game, nothing searched in an earlier game is kept
+        """
+        if self.kind == 'mcts':
+            self.mcts = MonteCarloTreeSearch(seed=self.seed)
+        else:
+            self.search = CheckersSearch(algorithm=SearchAlgorithm.PVS if self.kind ==
+                                         'pvs' else SearchAlgorithm.ALPHABETA)
+
+    def choose(self: SelfPlayEngine, state: CheckersState) -> tuple[Optional[CheckersMove], dict[str, int]]:
+        """
+        Returns:
+            The move to play and the search counters of the move (the # of iterations for mcts)
+        """
+        if self.mcts is not None:
+            move = self.mcts.search(state, self.time_budget)
+            return move, {'iterations': self.mcts.iterations}
+
+        if self.depth is not None:
+            _, move = self.search.search(state, self.depth)
+        else:
+            _, move = self.search.iterative_deepening(state, self.time_budget)
+        return move, {'nodes': self.search.nodes, 'expanded': self.search.expanded, 'generated_moves': self.search.generated_moves,
+                      'cutoffs': self.search.cutoffs, 'first_move_cutoffs': self.search.first_move_cutoffs}
+
+    def advance(self: SelfPlayEngine, move: CheckersMove) -> None:
+        if self.mcts is not None:
+            self.mcts.advance(move)
+
+    def __str__(self: SelfPlayEngine) -> str:
+        if self.kind == 'mcts' or self.depth is None:
+            return f'{self.kind}@{self.time_budget}s'
+        return f'{self.kind}:{self.depth}'
+
+
+def play_game(bottom_engine: SelfPlayEngine, top_engine: SelfPlayEngine, rows: int = 8, cols: int = 8, max_plies: int = 200, opening_plies: int = 2, seed: int = 0) -> dict:
+    """
+    Plays one game between the engines, the first `opening_plies` moves are random so repeated games differ
+
+    Returns:
+        The game's winner (None for a draw), plies and seconds, and per side (BOTTOM / TOP) the move times and summed
+        search counters of its engine
+    """
+    generator = Random(seed)
+    state = init_board(CheckersState(rows, cols, generator.choice(
+        [CheckersPlayer.BOTTOM, CheckersPlayer.TOP])))
+    engines = {CheckersPlayer.BOTTOM: bottom_engine,
+               CheckersPlayer.TOP: top_engine}
+    for each_engine in engines.values():
+        each_engine.reset()
+
+    sides: dict[CheckersPlayer, dict] = {
+        x: {'move_times': []} for x in engines.keys()}
+    winner: Optional[CheckersPlayer] = None
+    started = perf_counter()
+    plies = 0
+    while plies < max_plies:
+        moves = state.generate_potential_moves()
+        if not moves:
+            winner = state.opponent_of(state.turn)
+            break
+        if plies < opening_plies:
+            move = generator.choice(moves)
+        else:
+            side = sides[state.turn]
+            move_started = perf_counter()
+            move, move_counters = engines[state.turn].choose(state)
+            side['move_times'].append(perf_counter() - move_started)
+            for each_counter, each_value in move_counters.items():
+                side[each_counter] = side.get(each_counter, 0) + each_value
+        for each_engine in engines.values():
+            each_engine.advance(move)
+        state = state.process_move(move)
+        plies += 1
+
+    return {
+        'winner': winner.name if winner is not None else None,
+        'plies': plies,
+        'seconds': perf_counter() - started,
+        'engines': {x.name: y for x, y in sides.items()},
+    }
+
+
+def play_indexed_game(arguments: tuple) -> dict:
+    # picklable entry point for the process pool
+    bottom_engine, top_engine, rows, cols, max_plies, opening_plies, seed = arguments
+    return play_game(bottom_engine, top_engine, rows, cols, max_plies, opening_plies, seed)
+
+
+def summarize_engine(engine: SelfPlayEngine, sides: list[dict]) -> dict:
+    """
+    The throughput of one engine over the games it played, rates are over the time it spent choosing its moves
+
+    Returns:
+        The summed counters, nodes (iterations for mcts) per second, average branching factor (generated moves per
+        expanded node), cutoff rate (cutoffs per expanded node), first move cutoff rate (share of the cutoffs caused
+        by the first move) and move times
+    """
+    move_times = [y for x in sides for y in x['move_times']]
+    searched = sum(move_times)
+    counters: dict[str, int] = {}
+    for each_side in sides:
+        for each_counter, each_value in each_side.items():
+            if each_counter != 'move_times':
+                counters[each_counter] = counters.get(each_counter, 0) + each_value
+
+    summary: dict = {'engine': str(engine), 'moves': len(move_times), **counters}
+    if 'iterations' in counters:
+        summary['iterations_per_second'] = counters['iterations'] / searched if searched else 0.0
+    if 'nodes' in counters:
+        expanded = counters['expanded']
+        summary['nodes_per_second'] = counters['nodes'] / searched if searched else 0.0
+        summary['average_branching_factor'] = counters['generated_moves'] / expanded if expanded else 0.0
+        summary['cutoff_rate'] = counters['cutoffs'] / expanded if expanded else 0.0
+        summary['first_move_cutoff_rate'] = counters['first_move_cutoffs'] / \
+            counters['cutoffs'] if counters['cutoffs'] else 0.0
+    summary['average_move_seconds'] = searched / len(move_times) if move_times else 0.0
+    summary['max_move_seconds'] = max(move_times, default=0.0)
+    return summary
+
+
+def run_selfplay(games: int, bottom_engine: SelfPlayEngine, top_engine: SelfPlayEngine, rows: int = 8, cols: int = 8, max_plies: int = 200, opening_plies: int = 2, processes: int = 1, seed: int = 0) -> dict:
+    """
+    Plays `games` games (spread over `processes` worker processes) and summarizes the throughput of the engines
+
+    Returns:
+        The summary: results, games/sec, average plies and the summarize_engine throughput of each side's engine
+    """
+    arguments = [(bottom_engine, top_engine, rows, cols, max_plies, opening_plies, seed + x)
+                 for x in range(games)]
+    started = perf_counter()
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(play_indexed_game, arguments))
+    else:
+        results = [play_indexed_game(x) for x in arguments]
+    elapsed = perf_counter() - started
+
+    return {
+        'board': f'{rows}x{cols}',
+        'games': games,
+        'processes': processes,
+        'results': {x or 'DRAW': sum(1 for y in results if y['winner'] == x) for x in ('BOTTOM', 'TOP', None)},
+        'seconds': elapsed,
+        'games_per_second': games / elapsed if elapsed else 0.0,
+        'average_plies': sum(x['plies'] for x in results) / games if games else 0.0,
+        # kept apart per side, the engines' counters (and mcts iterations against search nodes) do not add up
+        'engines': {x: summarize_engine(y, [z['engines'][x] for z in results])
+                    for x, y in (('BOTTOM', bottom_engine), ('TOP', top_engine))},
+    }
+
+
+if __name__ == '__main__':
+    SELFPLAY_GAMES = 10
+    SELFPLAY_PROCESSES = 1
+    SELFPLAY_OUTPUT = 'selfplay.json'
+    summary = run_selfplay(SELFPLAY_GAMES, SelfPlayEngine('pvs', 4), SelfPlayEngine('alphabeta', 4),
+                           processes=SELFPLAY_PROCESSES)
+    with open(SELFPLAY_OUTPUT, 'w', encoding='utf-8') as output_file:
+        json.dump(summary, output_file, indent=4)
+    print(json.dumps(summary, indent=4))
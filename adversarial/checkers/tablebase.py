@@ -0,0 +1,377 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+from enum import Enum
+from math import comb
+from array import array
+from heapq import heappop, heappush
+import mmap
+import struct
+import sys
+
+if TYPE_CHECKING:
+    from checkers import BoardGeometry
+
+
+TABLEBASE_MAGIC = b'CKTB'
+TABLEBASE_VERSION = 2
+
+# magic, version, rows, cols, max pieces, # of tables
+HEADER_FORMAT = '<4sHBBBH'
+# bottom men, bottom kings, top men, top kings, byte offset of the results, # of positions
+TABLE_FORMAT = '<BBBBQQ'
+# one little endian entry per (position, player to move): the TablebaseResult in the low 2 bits and, for won and lost
+# positions, the # of plies to the end of the game above them
+ENTRY_FORMAT = '<H'
+ENTRY_RESULT_BITS = 2
+
+# (bottom men, bottom kings, top men, top kings)
+MaterialSignature = tuple[int, int, int, int]
+
+
+class TablebaseResult(Enum):
+    """
+    The game theoretic value of a position for the player to move, stored in the low 2 bits of its entry
+
+    UNKNOWN marks the indexes that are not a legal position (a man standing on its own promotion row)
+    """
+    UNKNOWN = 0
+    WIN = 1
+    LOSS = 2
+    DRAW = 3
+
+
+def material_signature(bottom: int, top: int, kings: int) -> MaterialSignature:
+    return ((bottom & ~kings).bit_count(), (bottom & kings).bit_count(), (top & ~kings).bit_count(), (top & kings).bit_count())
+
+
+def material_signatures(max_pieces: int) -> list[MaterialSignature]:
+    """
+    Every signature with both sides on the board and at most `max_pieces` pieces, in the order they are solved: fewer
+    pieces first (captures), then fewer men (promotions), so every move out of a signature lands in one already solved
+    """
+    signatures: list[MaterialSignature] = []
+    for total in range(2, max_pieces + 1):
+        for bottom_count in range(1, total):
+            top_count = total - bottom_count
+            for bottom_men in range(bottom_count + 1):
+                for top_men in range(top_count + 1):
+                    signatures.append(
+                        (bottom_men, bottom_count - bottom_men, top_men, top_count - top_men))
+    return sorted(signatures, key=lambda x: (sum(x), x[0] + x[2]))
+
+
+def placement_counts(signature: MaterialSignature) -> tuple[int, int, int, int]:
+    # the order position_index places the piece sets in: bottom men, top men, bottom kings, top kings
+    return (signature[0], signature[2], signature[1], signature[3])
+
+
+def signature_size(signature: MaterialSignature, playable: int) -> int:
+    """
+    The # of positions of the signature: every piece set is placed on the playable squares the earlier sets left free
+    """
+    size = 1
+    for each_count in placement_counts(signature):
+        size *= comb(playable, each_count)
+        playable -= each_count
+    return size
+
+
+def position_index(geometry: BoardGeometry, bottom: int, top: int, kings: int) -> Optional[int]:
+    """
+    The perfect index of the position inside its material signature
+
+    Piece sets are ranked in the order bottom men, top men, bottom kings, top kings, each one with the combinatorial number
+    system over the playable squares (of the board's geometry) not taken by the sets before it
+
+    Returns:
+        The index, None if a piece stands on a square that is not playable
+    """
+    if (bottom | top) & ~geometry.playable:
+        return None
+    index_of = geometry.playable_index
+    free_count = len(geometry.playable_squares)
+    occupied = 0
+    index = 0
+    for each_set in (bottom & ~kings, top & ~kings, bottom & kings, top & kings):
+        rank = 0
+        count = 0
+        remaining = each_set
+        while remaining:
+            low_bit = remaining & -remaining
+            square = low_bit.bit_length() - 1
+            count += 1
+            # the index among the squares that are still free
+            rank += comb(index_of[square] -
+                         (occupied & (low_bit - 1)).bit_count(), count)
+            remaining ^= low_bit
+        index = index * comb(free_count, count) + rank
+        free_count -= count
+        occupied |= each_set
+    return index
+
+
+def position_from_index(geometry: BoardGeometry, signature: MaterialSignature, index: int) -> tuple[int, int, int]:
+    """
+    Inverse of position_index
+
+    Returns:
+        The (bottom, top, kings) masks
+    """
+    squares = geometry.playable_squares
+    free_count = len(squares)
+    counts = placement_counts(signature)
+    ranks: list[int] = []
+    for each_count in counts:
+        ranks.append(comb(free_count, each_count))
+        free_count -= each_count
+    # peel the ranks off from the last set, which is the least significant
+    set_ranks = [0] * 4
+    for ind in range(3, -1, -1):
+        index, set_ranks[ind] = divmod(index, ranks[ind])
+
+    free = list(squares)
+    masks = [0, 0, 0, 0]
+    for ind, each_count in enumerate(counts):
+        rank = set_ranks[ind]
+        chosen: list[int] = []
+        for count in range(each_count, 0, -1):
+            position = count - 1
+            while comb(position + 1, count) <= rank:
+                position += 1
+            rank -= comb(position, count)
+            chosen.append(position)
+        for each_position in chosen:
+            masks[ind] |= 1 << free[each_position]
+        # chosen is highest first, so deleting in order keeps the other positions valid
+        for each_position in chosen:
+            del free[each_position]
+
+    bottom_men, top_men, bottom_kings, top_kings = masks
+    return bottom_men | bottom_kings, top_men | top_kings, bottom_kings | top_kings
+
+
+class EndgameTablebase:
+    """
+    Read only, memory mapped win / loss / draw tables with the distance to the end of the game, written by
+    write_tablebase, a probe reads a single entry
+
+    Arguments:
+        self (EndgameTablebase): The internal state
+        path (str): The tablebase file
+
+    Returns:
+        The tablebase instance
+    """
+
+    def __init__(self: EndgameTablebase, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.max_pieces, table_count = struct.unpack_from(
+            HEADER_FORMAT, self.data, 0)
+        if magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION:
+            self.close()
+            raise ValueError(
+                f'{path} is not a version {TABLEBASE_VERSION} checkers tablebase')
+
+        # signature -> byte offset of its results
+        self.tables: dict[MaterialSignature, int] = {}
+        table_offset = struct.calcsize(HEADER_FORMAT)
+        for _ in range(table_count):
+            bottom_men, bottom_kings, top_men, top_kings, offset, _ = struct.unpack_from(
+                TABLE_FORMAT, self.data, table_offset)
+            self.tables[(bottom_men, bottom_kings,
+                         top_men, top_kings)] = offset
+            table_offset += struct.calcsize(TABLE_FORMAT)
+        self.hits = 0
+
+    def probe(self: EndgameTablebase, geometry: BoardGeometry, bottom: int, top: int, kings: int, top_to_move: bool) -> Optional[tuple[TablebaseResult, int]]:
+        """
+        Looks the position up, `geometry` is the BoardGeometry of the position's board
+
+        Returns:
+            The result for the player to move and the # of plies to the end of the game with best play (the quickest
+            win, the slowest loss, 0 for a draw), None if the position is not covered by the tablebase
+        """
+        if geometry.rows != self.rows or geometry.cols != self.cols or not bottom or not top or (bottom | top).bit_count() > self.max_pieces:
+            return None
+        offset = self.tables.get(material_signature(bottom, top, kings))
+        if offset is None:
+            return None
+        index = position_index(geometry, bottom, top, kings)
+        if index is None:
+            return None
+
+        entry, = struct.unpack_from(
+            ENTRY_FORMAT, self.data, offset + (index * 2 + top_to_move) * struct.calcsize(ENTRY_FORMAT))
+        result = TablebaseResult(entry & (1 << ENTRY_RESULT_BITS) - 1)
+        if result == TablebaseResult.UNKNOWN:
+            return None
+        self.hits += 1
+        return result, entry >> ENTRY_RESULT_BITS
+
+    def close(self: EndgameTablebase) -> None:
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self: EndgameTablebase) -> EndgameTablebase:
+        return self
+
+    def __exit__(self: EndgameTablebase, *args) -> None:
+        self.close()
+
+
+def write_tablebase(path: str, rows: int, cols: int, max_pieces: int, tables: dict[MaterialSignature, array]) -> None:
+    """
+    Writes the entries of solve_tablebase after a header and the offset of every signature's entries
+    """
+    signatures = list(tables.keys())
+    offset = struct.calcsize(HEADER_FORMAT) + \
+        len(signatures) * struct.calcsize(TABLE_FORMAT)
+    header = [struct.pack(HEADER_FORMAT, TABLEBASE_MAGIC, TABLEBASE_VERSION,
+                          rows, cols, max_pieces, len(signatures))]
+    packed_tables: list[bytes] = []
+    for each_signature in signatures:
+        results = tables[each_signature]
+        if sys.byteorder == 'big':
+            results = array(results.typecode, results)
+            results.byteswap()
+        packed = results.tobytes()
+        header.append(struct.pack(TABLE_FORMAT, *each_signature,
+                      offset, len(results) // 2))
+        packed_tables.append(packed)
+        offset += len(packed)
+
+    with open(path, 'wb') as tablebase_file:
+        tablebase_file.write(b''.join(header))
+        for each_packed in packed_tables:
+            tablebase_file.write(each_packed)
+
+
+def solve_tablebase(rows: int, cols: int, max_pieces: int) -> dict[MaterialSignature, array]:
+    """
+    Retrograde analysis of every position with at most `max_pieces` pieces, one signature at a time
+
+    Moves that capture or promote lead into signatures that are already solved and are looked up. Inside a signature
+    positions without moves are lost, and results are propagated backwards along the moves in order of their distance
+    to the end of the game: a position is won in one ply more than its quickest move to a lost position, and lost in
+    one ply more than its slowest move once every move reaches a won one. Positions never resolved can be played
+    forever and are draws
+
+    Returns:
+        signature -> one entry (TablebaseResult | plies << ENTRY_RESULT_BITS) per (position index * 2 + top to move)
+    """
+    # the engine imports this module for the probe, so it is only imported once a tablebase is built
+    from checkers import CheckersPlayer, CheckersState
+
+    state = CheckersState(rows, cols, CheckersPlayer.BOTTOM)
+    geometry = state.geometry
+    squares = geometry.playable_squares
+    bottom_promotion_row = geometry.promotion_rows[CheckersPlayer.BOTTOM]
+    top_promotion_row = geometry.promotion_rows[CheckersPlayer.TOP]
+    max_plies = (1 << 8 * struct.calcsize(ENTRY_FORMAT) - ENTRY_RESULT_BITS) - 1
+    tables: dict[MaterialSignature, array] = {}
+
+    def solved_entry(bottom: int, top: int, kings: int, top_to_move: bool) -> tuple[TablebaseResult, int]:
+        if not (top if top_to_move else bottom):
+            return TablebaseResult.LOSS, 0
+        index = position_index(geometry, bottom, top, kings)
+        entry = tables[material_signature(bottom, top, kings)][index * 2 + top_to_move]
+        return TablebaseResult(entry & (1 << ENTRY_RESULT_BITS) - 1), entry >> ENTRY_RESULT_BITS
+
+    for each_signature in material_signatures(max_pieces):
+        if sum(each_signature) > len(squares):
+            continue
+        size = signature_size(each_signature, len(squares)) * 2
+        results = array('H', bytes(size * 2))
+        # moves left that do not reach a won position, the slowest win reached so far, and the positions that reach
+        # each position within the signature
+        escapes = [0] * size
+        slowest_win = [-1] * size
+        predecessors: dict[int, list[int]] = {}
+        # (plies, entry, result) of the positions whose result is known, resolved in order of plies
+        pending: list[tuple[int, int, int]] = []
+        undecided: list[int] = []
+
+        for entry in range(size):
+            bottom, top, kings = position_from_index(
+                geometry, each_signature, entry // 2)
+            if bottom & ~kings & bottom_promotion_row or top & ~kings & top_promotion_row:
+                # a man on its promotion row would have been crowned
+                continue
+            top_to_move = entry % 2 == 1
+            state.bottom, state.top, state.kings = bottom, top, kings
+            state.turn = CheckersPlayer.TOP if top_to_move else CheckersPlayer.BOTTOM
+
+            moves = state.generate_potential_moves()
+            quickest_win: Optional[int] = 0 if not moves else None
+            for each_move in moves:
+                undo_token = state.make_move(each_move)
+                next_bottom, next_top, next_kings = state.bottom, state.top, state.kings
+                state.unmake_move(undo_token)
+
+                if material_signature(next_bottom, next_top, next_kings) == each_signature:
+                    next_entry = position_index(
+                        geometry, next_bottom, next_top, next_kings) * 2 + (not top_to_move)
+                    predecessors.setdefault(next_entry, []).append(entry)
+                    escapes[entry] += 1
+                    continue
+                next_result, next_plies = solved_entry(
+                    next_bottom, next_top, next_kings, not top_to_move)
+                if next_result == TablebaseResult.LOSS:
+                    # a move inside the signature may still win sooner, the entry is only resolved in order
+                    quickest_win = next_plies + 1 if quickest_win is None else min(quickest_win, next_plies + 1)
+                elif next_result == TablebaseResult.WIN:
+                    slowest_win[entry] = max(slowest_win[entry], next_plies)
+                else:
+                    escapes[entry] += 1
+
+            if not moves:
+                heappush(pending, (0, entry, TablebaseResult.LOSS.value))
+            elif quickest_win is not None:
+                heappush(pending, (quickest_win, entry, TablebaseResult.WIN.value))
+                # a won position never runs out of escapes
+                escapes[entry] += 1
+            elif escapes[entry] == 0:
+                # every move captured or promoted into a won position for the opponent
+                heappush(pending, (slowest_win[entry] + 1, entry, TablebaseResult.LOSS.value))
+            undecided.append(entry)
+
+        while pending:
+            plies, entry, result = heappop(pending)
+            if results[entry]:
+                continue
+            if plies > max_plies:
+                raise ValueError(f'{plies} plies to the end do not fit in a tablebase entry')
+            results[entry] = result | plies << ENTRY_RESULT_BITS
+            for each_predecessor in predecessors.get(entry, []):
+                if results[each_predecessor]:
+                    continue
+                if result == TablebaseResult.LOSS.value:
+                    heappush(pending, (plies + 1, each_predecessor, TablebaseResult.WIN.value))
+                    continue
+                escapes[each_predecessor] -= 1
+                slowest_win[each_predecessor] = max(slowest_win[each_predecessor], plies)
+                if escapes[each_predecessor] == 0:
+                    heappush(pending, (slowest_win[each_predecessor] + 1, each_predecessor,
+                                       TablebaseResult.LOSS.value))
+
+        for each_entry in undecided:
+            if not results[each_entry]:
+                # can be played forever without either side forcing a win
+                results[each_entry] = TablebaseResult.DRAW.value
+        tables[each_signature] = results
+    return tables
+
+
+def build_tablebase(path: str, rows: int, cols: int, max_pieces: int) -> None:
+    write_tablebase(path, rows, cols, max_pieces,
+                    solve_tablebase(rows, cols, max_pieces))
+
+
+if __name__ == '__main__':
+    TABLEBASE_ROWS = 8
+    TABLEBASE_COLS = 8
+    TABLEBASE_MAX_PIECES = 3
+    build_tablebase(f'endgame_{TABLEBASE_ROWS}x{TABLEBASE_COLS}.cktb',
+                    TABLEBASE_ROWS, TABLEBASE_COLS, TABLEBASE_MAX_PIECES)
@@ -0,0 +1,141 @@
+from __future__ import annotations
+from typing import Any, Optional, List
+from enum import Enum
+from functools import lru_cache
+from random import Random
+
+
+ZOBRIST_SEED = 0x5EED_C4EC
+
+
+class PieceKind(Enum):
+    """
+    Index of each kind of piece in the zobrist key tables
+    """
+    BOTTOM_MAN = 0
+    BOTTOM_KING = 1
+    TOP_MAN = 2
+    TOP_KING = 3
+
+
+class ZobristKeys:
+    """
+    Random 64-bit keys for every (piece kind, square) pair, plus one for the side to move
+
+    Arguments:
+        self (ZobristKeys): The internal state
+        squares (int): The # of squares on the board
+        seed (int): The seed of the key generator, fixed so hashes are stable between runs
+    """
+
+    def __init__(self: ZobristKeys, squares: int, seed: int = ZOBRIST_SEED) -> None:
+        generator = Random(seed)
+        self.squares = squares
+        self.pieces: List[List[int]] = [
+            [generator.getrandbits(64) for _ in range(squares)] for _ in PieceKind]
+        self.side: int = generator.getrandbits(64)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(squares: int) -> ZobristKeys:
+    return ZobristKeys(squares)
+
+
+class TranspositionBound(Enum):
+    """
+    How the stored score relates to the true score of the position
+    """
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+
+class TranspositionEntry:
+    """
+    A single slot of the transposition table
+
+    Arguments:
+        self (TranspositionEntry): The internal state
+        key (int): The full zobrist hash of the position, used to detect index collisions
+        depth (int): The remaining depth the score was searched to
+        bound (TranspositionBound): Whether the score is exact or a bound
+        score (float): The score of the position
+        best_move (Any): The best move found in the position (if any)
+        generation (int): The search the entry was stored in
+    """
+    __slots__ = ('key', 'depth', 'bound', 'score', 'best_move', 'generation')
+
+    def __init__(self: TranspositionEntry, key: int, depth: int, bound: TranspositionBound, score: float, best_move: Any, generation: int) -> None:
+        self.key = key
+        self.depth = depth
+        self.bound = bound
+        self.score = score
+        self.best_move = best_move
+        self.generation = generation
+
+
+class TranspositionTable:
+    """
+    Fixed size, hash indexed cache of search results
+
+    Replacement policy: a slot is overwritten when it is empty, holds the same position, was stored by an older search,
+    or was searched to a depth no greater than the new entry's
+
+    Arguments:
+        self (TranspositionTable): The internal state
+        size_bits (int): The table holds 2 ** size_bits entries
+    """
+
+    def __init__(self: TranspositionTable, size_bits: int = 18) -> None:
+        self.size = 1 << size_bits
+        self.index_mask = self.size - 1
+        self.entries: List[Optional[TranspositionEntry]] = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self: TranspositionTable, key: int) -> Optional[TranspositionEntry]:
+        entry = self.entries[key & self.index_mask]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self: TranspositionTable, key: int, depth: int, bound: TranspositionBound, score: float, best_move: Any = None) -> None:
+        index = key & self.index_mask
+        entry = self.entries[index]
+        if entry is None:
+            self.entries[index] = TranspositionEntry(
+                key, depth, bound, score, best_move, self.generation)
+            self.stores += 1
+            return
+
+        if entry.key != key and entry.generation == self.generation and entry.depth > depth:
+            return
+
+        if entry.key == key and best_move is None:
+            # keep the move from a previous search of the same position for ordering
+            best_move = entry.best_move
+
+        entry.key = key
+        entry.depth = depth
+        entry.bound = bound
+        entry.score = score
+        entry.best_move = best_move
+        entry.generation = self.generation
+        self.stores += 1
+
+    def new_search(self: TranspositionTable) -> None:
+        """
+        Ages every stored entry, so they are preferred for replacement by the next search
+        """
+        self.generation += 1
+
+    def clear(self: TranspositionTable) -> None:
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __len__(self: TranspositionTable) -> int:
+        return sum(1 for x in self.entries if x is not None)